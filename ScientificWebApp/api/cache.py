@@ -0,0 +1,179 @@
+import hashlib
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+# ========== LRU CACHE ==========
+
+def _sizeof(value):
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries=256, max_bytes=None, sizeof=_sizeof):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+            }
+
+# ========== SESSIONS ==========
+
+class SessionStore:
+    """In-memory objects addressed by id, evicted after ``ttl`` seconds idle
+    or when more than ``max_entries`` (or ``max_bytes``, as measured by
+    ``sizeof``) are held, least recently used first. The most recent entry is
+    never evicted for size."""
+
+    def __init__(self, max_entries=256, ttl=3600, max_bytes=None, sizeof=_sizeof):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._data:
+            key, (_, touched, _) = next(iter(self._data.items()))
+            full = len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1)
+            if now - touched <= self.ttl and not full:
+                break
+            self._bytes -= self._data.pop(key)[2]
+
+    def create(self, value):
+        session_id = uuid.uuid4().hex
+        now = time.monotonic()
+        size = self.sizeof(value)
+        with self._lock:
+            self._data[session_id] = (value, now, size)
+            self._bytes += size
+            self._expire(now)
+        return session_id
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if session_id not in self._data:
+                return None
+            value, _, size = self._data[session_id]
+            self._data[session_id] = (value, now, size)
+            self._data.move_to_end(session_id)
+            return value
+
+    def resize(self, session_id):
+        """Re-measure an entry that changed in place (e.g. grew), evicting
+        others if the store is now over ``max_bytes``."""
+        now = time.monotonic()
+        with self._lock:
+            if session_id not in self._data:
+                return
+            value, _, old_size = self._data[session_id]
+            size = self.sizeof(value)
+            self._data[session_id] = (value, now, size)
+            self._data.move_to_end(session_id)
+            self._bytes += size - old_size
+            self._expire(now)
+
+    def pop(self, session_id):
+        with self._lock:
+            entry = self._data.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+        return None if entry is None else entry[0]
+
+    def __len__(self):
+        return len(self._data)
+
+# ========== KEYS ==========
+
+def array_key(*arrays, extra=()):
+    """Content hash of float64 arrays plus any extra hashable fields."""
+    h = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        buf = np.ascontiguousarray(arr, dtype=np.float64)
+        h.update(len(buf).to_bytes(8, "little"))
+        h.update(buf.tobytes())
+    for field in extra:
+        h.update(repr(field).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def derived_key(base, *fields):
+    """Key for something derived from an already-hashed input (e.g. a plot)."""
+    return array_key(extra=(base,) + fields)
+
+def _spec_sizeof(spec):
+    """Bytes held by the arrays inside a plot spec."""
+    def walk(v):
+        if isinstance(v, np.ndarray):
+            return v.nbytes
+        if isinstance(v, dict):
+            return sum(walk(i) for i in v.values())
+        if isinstance(v, (list, tuple)):
+            return 8 * len(v)
+        return 0
+    return walk(spec) + 512
+
+# Fit / gauss statistics are small; images dominate memory.
+fit_cache = LRUCache(max_entries=1024)
+gauss_cache = LRUCache(max_entries=1024)
+image_cache = LRUCache(max_entries=256, max_bytes=64 * 1024 * 1024)
+# What's needed to re-render a result at another size/format, by result id
+plot_specs = LRUCache(max_entries=512, max_bytes=128 * 1024 * 1024, sizeof=_spec_sizeof)
+
+def all_stats():
+    return {
+        "fit": fit_cache.stats(),
+        "gauss": gauss_cache.stats(),
+        "image": image_cache.stats(),
+        "plot_specs": plot_specs.stats(),
+    }
@@ -0,0 +1,85 @@
+import base64
+
+import numpy as np
+
+# ========== ARRAY ENCODING ==========
+#
+# Large arrays can travel as base64 little-endian buffers
+# ({"dtype": "f8", "data": "..."}), as a raw application/octet-stream body, or
+# as an Arrow IPC stream. All of them decode straight into NumPy with
+# frombuffer, without creating a Python float per element.
+
+DTYPES = {
+    "f8": "<f8",
+    "float64": "<f8",
+    "f4": "<f4",
+    "float32": "<f4",
+}
+
+OCTET_STREAM = "application/octet-stream"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+class CodecError(ValueError):
+    pass
+
+def _dtype(name):
+    try:
+        return np.dtype(DTYPES[(name or "f8").lower()])
+    except KeyError:
+        raise CodecError(f"dtype no soportado: {name} (usa f8 o f4)")
+
+def _from_bytes(buf, dtype):
+    dt = _dtype(dtype)
+    if len(buf) % dt.itemsize:
+        raise CodecError("El tamaño del buffer no es múltiplo del dtype")
+    arr = np.frombuffer(buf, dtype=dt)
+    # float32 is widened once; float64 stays a zero-copy view
+    return arr.astype(np.float64, copy=False)
+
+def decode_b64(data, dtype="f8"):
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (ValueError, TypeError):
+        raise CodecError("base64 inválido")
+    return _from_bytes(raw, dtype)
+
+def encode_b64(arr, dtype="f8"):
+    dt = _dtype(dtype)
+    buf = np.ascontiguousarray(arr, dtype=dt).tobytes()
+    return {"dtype": dt.str.lstrip("<"), "data": base64.b64encode(buf).decode("ascii")}
+
+def as_array(value):
+    """Float64 array from a list, an encoded array or an ndarray (None passes)."""
+    if value is None or isinstance(value, np.ndarray):
+        return value
+    if isinstance(value, (list, tuple)):
+        return np.array(value, dtype=float)
+    data = value["data"] if isinstance(value, dict) else value.data
+    dtype = value.get("dtype") if isinstance(value, dict) else value.dtype
+    return decode_b64(data, dtype)
+
+def decode_raw(body, columns, dtype="f8"):
+    """Split a raw body holding len(columns) equal-length blocks, one per
+    column in order (e.g. all x, then all y, ...)."""
+    arr = _from_bytes(body, dtype)
+    if len(arr) % len(columns):
+        raise CodecError(f"El cuerpo debe contener {len(columns)} columnas de igual longitud")
+    return dict(zip(columns, arr.reshape(len(columns), -1)))
+
+def decode_arrow(body):
+    """Columns of an Arrow IPC stream as float64 arrays (needs pyarrow)."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise CodecError("Arrow IPC requiere pyarrow en el servidor")
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise CodecError(f"Stream Arrow IPC inválido: {e}")
+    try:
+        return {
+            name.lower(): table.column(name).to_numpy().astype(np.float64, copy=False)
+            for name in table.column_names
+        }
+    except (pa.ArrowInvalid, ValueError, TypeError):
+        raise CodecError("Las columnas Arrow deben ser numéricas")
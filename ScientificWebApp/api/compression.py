@@ -0,0 +1,50 @@
+import gzip
+
+# ========== RESPONSE COMPRESSION ==========
+#
+# JSON bodies above COMPRESS_MIN_BYTES are compressed with brotli when the
+# client accepts it and the optional ``brotli`` package is installed, else
+# with gzip. Small bodies aren't worth the CPU.
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = ("application/json",)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def _accepted(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        if token:
+            accepted.add(token)
+    return accepted
+
+def choose_encoding(accept_encoding):
+    accepted = _accepted(accept_encoding or "")
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=5)
+
+def should_compress(headers):
+    content_type = headers.get("content-type", "").split(";")[0].strip()
+    return content_type in COMPRESSIBLE_TYPES and "content-encoding" not in headers
+
+def add_vary(vary, field="Accept-Encoding"):
+    """``vary`` with ``field`` appended, keeping what is already there (e.g.
+    the Origin that CORS adds)."""
+    fields = [f.strip() for f in (vary or "").split(",") if f.strip()]
+    if "*" in fields or field.lower() in (f.lower() for f in fields):
+        return ", ".join(fields)
+    return ", ".join(fields + [field])
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import cache
+
+# ========== DATASET STORE ==========
+#
+# Uploaded tables are kept on local disk as one (4, N) float64 .npy file per
+# dataset (rows x, y, dx, dy) and opened memory-mapped, so fitting by
+# reference reads the columns in place without JSON or pydantic in between.
+# Ids are content hashes: re-uploading the same data reuses the same entry.
+# Entries not touched for DATASET_TTL seconds are deleted.
+
+DATASET_DIR = os.environ.get("DATASET_DIR", os.path.join(tempfile.gettempdir(), "scihispida_datasets"))
+DATASET_TTL = int(os.environ.get("DATASET_TTL", 3600))
+SWEEP_INTERVAL = 60
+
+COLUMNS = ("x", "y", "dx", "dy")
+
+class DatasetNotFound(KeyError):
+    pass
+
+class DatasetStore:
+    def __init__(self, directory=DATASET_DIR, ttl=DATASET_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, dataset_id, ext):
+        if not dataset_id.isalnum():
+            raise DatasetNotFound(dataset_id)
+        return os.path.join(self.directory, f"{dataset_id}.{ext}")
+
+    def put(self, x, y, dx, dy, meta=None):
+        """Store four equal-length columns and return the dataset id."""
+        table = np.vstack([np.asarray(c, dtype=np.float64) for c in (x, y, dx, dy)])
+        dataset_id = cache.array_key(*table)
+        path = self._path(dataset_id, "npy")
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, table)
+            os.replace(tmp, path)
+            with open(self._path(dataset_id, "json"), "w") as f:
+                json.dump(dict(meta or {}, n_rows=table.shape[1]), f)
+        self.sweep()
+        return dataset_id
+
+    def get(self, dataset_id):
+        """Memory-mapped columns as a dict of read-only float64 arrays."""
+        path = self._path(dataset_id, "npy")
+        try:
+            table = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except FileNotFoundError:
+            raise DatasetNotFound(dataset_id)
+        self.sweep()
+        return dict(zip(COLUMNS, table))
+
+    def meta(self, dataset_id):
+        try:
+            with open(self._path(dataset_id, "json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise DatasetNotFound(dataset_id)
+
+    def delete(self, dataset_id):
+        for ext in ("npy", "json"):
+            try:
+                os.remove(self._path(dataset_id, ext))
+            except FileNotFoundError:
+                pass
+
+    def sweep(self, force=False):
+        """Delete datasets idle for longer than the TTL (at most once a minute)."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    self.delete(name[:-4])
+            except FileNotFoundError:
+                pass
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = DatasetStore()
+    return _store
@@ -0,0 +1,237 @@
+import ast
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# ========== FORMULA ENGINE ==========
+#
+# A formula such as "x*sin(y)/z**2" is parsed once into a tree of closures.
+# Each closure returns (value, grad) where grad has one row per variable, so a
+# single NumPy pass gives the result and every partial derivative (forward
+# mode). Compiled formulas are cached by their text.
+
+# name -> (function, derivative)
+FUNCTIONS = {
+    "sin": (np.sin, np.cos),
+    "cos": (np.cos, lambda u: -np.sin(u)),
+    "tan": (np.tan, lambda u: 1 / np.cos(u) ** 2),
+    "asin": (np.arcsin, lambda u: 1 / np.sqrt(1 - u ** 2)),
+    "acos": (np.arccos, lambda u: -1 / np.sqrt(1 - u ** 2)),
+    "atan": (np.arctan, lambda u: 1 / (1 + u ** 2)),
+    "sinh": (np.sinh, np.cosh),
+    "cosh": (np.cosh, np.sinh),
+    "tanh": (np.tanh, lambda u: 1 / np.cosh(u) ** 2),
+    "exp": (np.exp, np.exp),
+    "ln": (np.log, lambda u: 1 / u),
+    "log": (np.log, lambda u: 1 / u),
+    "log10": (np.log10, lambda u: 1 / (u * math.log(10))),
+    "sqrt": (np.sqrt, lambda u: 0.5 / np.sqrt(u)),
+    "abs": (np.abs, np.sign),
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+# Deeply nested or very long expressions would exhaust the recursion limit
+# of the parser and of the compiled closures
+MAX_FORMULA_LENGTH = 2000
+MAX_FORMULA_DEPTH = 100
+
+class FormulaError(ValueError):
+    pass
+
+def forma_comun(values, names, uncertainties=None):
+    """Broadcast shape of the variables ``names`` (and their uncertainties);
+    FormulaError naming the variables whose lengths don't match."""
+    shapes = {name: np.shape(values[name]) for name in names}
+    if uncertainties:
+        shapes.update({f"Δ{name}": np.shape(uncertainties[name]) for name in names if name in uncertainties})
+    try:
+        return np.broadcast_shapes(*shapes.values()) if shapes else ()
+    except ValueError:
+        detail = ", ".join(f"{name} ({shape[0] if len(shape) == 1 else shape})"
+                           for name, shape in shapes.items() if shape)
+        raise FormulaError(f"Longitudes incompatibles: {detail}")
+
+class CompiledFormula:
+    def __init__(self, text, variables, root):
+        self.text = text
+        self.variables = variables
+        self._root = root
+
+    def evaluate(self, values):
+        """Evaluate over broadcast arrays. Returns (value, grad[nvars, N])."""
+        shape = forma_comun(values, self.variables)
+        args = [np.broadcast_to(np.asarray(values[v], dtype=float), shape) for v in self.variables]
+        with np.errstate(all="ignore"):
+            try:
+                value, grad = self._root(args, shape)
+            except RecursionError:
+                raise FormulaError("Fórmula demasiado anidada")
+        value = np.broadcast_to(value, shape)
+        grad = np.broadcast_to(grad, (len(self.variables),) + shape)
+        return value, grad
+
+    def propagate(self, values, uncertainties):
+        """First-order propagation for independent variables."""
+        forma_comun(values, self.variables, uncertainties)
+        value, grad = self.evaluate(values)
+        sigma = np.zeros_like(value, dtype=float)
+        partials = {}
+        for i, name in enumerate(self.variables):
+            d = np.asarray(uncertainties.get(name, 0.0), dtype=float)
+            sigma = sigma + (grad[i] * d) ** 2
+            partials[name] = grad[i]
+        return value, np.sqrt(sigma), partials
+
+def _compile(node, index):
+    nvars = len(index)
+
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, index)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        c = float(node.value)
+        return lambda args, shape: (c, 0.0)
+
+    if isinstance(node, ast.Name):
+        if node.id in CONSTANTS:
+            c = CONSTANTS[node.id]
+            return lambda args, shape: (c, 0.0)
+        i = index[node.id]
+
+        def var(args, shape):
+            grad = np.zeros((nvars,) + shape)
+            grad[i] = 1.0
+            return args[i], grad
+        return var
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        inner = _compile(node.operand, index)
+        if isinstance(node.op, ast.UAdd):
+            return inner
+
+        def neg(args, shape):
+            u, du = inner(args, shape)
+            return -u, -du
+        return neg
+
+    if isinstance(node, ast.BinOp):
+        left = _compile(node.left, index)
+        right = _compile(node.right, index)
+        op = node.op
+        if isinstance(op, ast.Add):
+            def add(args, shape):
+                u, du = left(args, shape)
+                v, dv = right(args, shape)
+                return u + v, du + dv
+            return add
+        if isinstance(op, ast.Sub):
+            def sub(args, shape):
+                u, du = left(args, shape)
+                v, dv = right(args, shape)
+                return u - v, du - dv
+            return sub
+        if isinstance(op, ast.Mult):
+            def mul(args, shape):
+                u, du = left(args, shape)
+                v, dv = right(args, shape)
+                return u * v, du * v + u * dv
+            return mul
+        if isinstance(op, ast.Div):
+            def div(args, shape):
+                u, du = left(args, shape)
+                v, dv = right(args, shape)
+                return u / v, (du * v - u * dv) / v ** 2
+            return div
+        if isinstance(op, ast.Pow):
+            constant_exp = isinstance(node.right, ast.Constant) or (
+                isinstance(node.right, ast.UnaryOp) and isinstance(node.right.operand, ast.Constant))
+
+            def power(args, shape):
+                u, du = left(args, shape)
+                v, dv = right(args, shape)
+                w = np.power(u, v)
+                if constant_exp:
+                    return w, v * np.power(u, v - 1) * du
+                # d(u^v) = v u^(v-1) du + u^v ln(u) dv
+                log_u = np.log(np.where(u > 0, u, 1.0))
+                return w, v * np.power(u, v - 1) * du + w * log_u * dv
+            return power
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id in FUNCTIONS and len(node.args) == 1 and not node.keywords:
+        f, df = FUNCTIONS[node.func.id]
+        inner = _compile(node.args[0], index)
+
+        def call(args, shape):
+            u, du = inner(args, shape)
+            return f(u), df(u) * du
+        return call
+
+    raise FormulaError(f"Expresión no soportada: {ast.unparse(node)}")
+
+def _profundidad(tree):
+    """Depth of an AST, walked iteratively."""
+    depth = 0
+    stack = [(tree, 1)]
+    while stack:
+        node, d = stack.pop()
+        depth = max(depth, d)
+        stack.extend((child, d + 1) for child in ast.iter_child_nodes(node))
+    return depth
+
+@lru_cache(maxsize=256)
+def compile_formula(text):
+    """Parse and compile a formula once; cached by its text."""
+    if len(text) > MAX_FORMULA_LENGTH:
+        raise FormulaError(f"Fórmula demasiado larga (máximo {MAX_FORMULA_LENGTH} caracteres)")
+    try:
+        tree = ast.parse(text.replace("^", "**"), mode="eval")
+    except SyntaxError as e:
+        raise FormulaError(f"Fórmula inválida: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise FormulaError("Fórmula demasiado anidada")
+    if _profundidad(tree) > MAX_FORMULA_DEPTH:
+        raise FormulaError(f"Fórmula demasiado anidada (máximo {MAX_FORMULA_DEPTH} niveles)")
+
+    calls = [n for n in ast.walk(tree) if isinstance(n, ast.Call)]
+    for call in calls:
+        if not (isinstance(call.func, ast.Name) and call.func.id in FUNCTIONS):
+            raise FormulaError("Función no soportada")
+    func_nodes = {id(call.func) for call in calls}
+    variables = tuple(sorted({
+        n.id for n in ast.walk(tree)
+        if isinstance(n, ast.Name) and id(n) not in func_nodes and n.id not in CONSTANTS
+    }))
+
+    root = _compile(tree, {v: i for i, v in enumerate(variables)})
+    return CompiledFormula(text, variables, root)
+
+def evaluar_formula(text, values, uncertainties):
+    """Evaluate a formula with first-order uncertainty propagation.
+
+    ``values`` and ``uncertainties`` map variable names to scalars or arrays.
+    Scalars in, scalars out; otherwise every result field is a list.
+    """
+    compiled = compile_formula(text)
+    missing = [v for v in compiled.variables if v not in values]
+    if missing:
+        raise FormulaError(f"Faltan valores para: {', '.join(missing)}")
+
+    value, sigma, partials = compiled.propagate(values, uncertainties)
+    invalid = ~(np.isfinite(value) & np.isfinite(sigma))
+
+    def clean(arr):
+        arr = np.where(invalid | ~np.isfinite(arr), 0.0, arr)
+        return float(arr) if arr.ndim == 0 else arr.tolist()
+
+    return {
+        "formula": text,
+        "variables": list(compiled.variables),
+        "value": clean(value),
+        "uncertainty": clean(sigma),
+        "partials": {k: clean(v) for k, v in partials.items()},
+        "invalid": bool(invalid) if invalid.ndim == 0 else invalid.tolist(),
+    }
@@ -1,11 +1,25 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Union
 import numpy as np
-import pandas as pd
-import io
+import os
+import json
+import asyncio
+import threading
+import time
 import logic
+import formula
+import cache
+import ingest
+import datasets
+import codec
+import compression
+import montecarlo
+import likelihood
+import metrics
 
 app = FastAPI()
 
@@ -26,23 +40,159 @@ class CalculationRequest(BaseModel):
     n: Optional[float] = 0.0
     a: Optional[float] = 0.0
 
-class FitRequest(BaseModel):
+class MonteCarloOptions(BaseModel):
+    samples: Optional[int] = None     # upper bound; sampling stops early once converged
+    confidence: Optional[float] = montecarlo.CONFIDENCE
+    seed: Optional[int] = None
+
+class CalculationBatchRequest(MonteCarloOptions):
+    operation: Union[str, List[str]]
     x: List[float]
-    y: List[float]
     dx: List[float]
-    dy: List[float]
-    model: Optional[str] = "linear"
+    y: Optional[List[float]] = None
+    dy: Optional[List[float]] = None
+    n: Optional[List[float]] = None
+    a: Optional[List[float]] = None
+    method: Optional[str] = "linear"  # linear | montecarlo
+
+class FormulaRequest(MonteCarloOptions):
+    formula: str
+    values: Dict[str, Union[float, List[float]]]
+    uncertainties: Optional[Dict[str, Union[float, List[float]]]] = {}
+    method: Optional[str] = "linear"  # linear | montecarlo
+
+class EncodedArray(BaseModel):
+    """Base64 of a little-endian float64 ("f8") or float32 ("f4") buffer."""
+    data: str
+    dtype: Optional[str] = "f8"
+
+ArrayField = Optional[Union[List[float], EncodedArray]]
+
+class FitData(BaseModel):
+    """The data and model of a fit, shared by the fit endpoints."""
+    x: ArrayField = None
+    y: ArrayField = None
+    dx: ArrayField = None
+    dy: ArrayField = None
+    dataset_id: Optional[str] = None
+    model: Optional[str] = "linear"  # a registered model, or "auto" to compare them all
+    use_dx: Optional[bool] = False  # errors-in-variables: fold dx in through the model slope
+
+class FitRequest(FitData, MonteCarloOptions):
+    encoding: Optional[str] = None  # "f8"/"f4": include the fitted curve base64-encoded
+    render: Optional[str] = "png"   # png | svg | data | none
+    models: Optional[List[str]] = None  # compare these models and rank them
+    overlay: Optional[bool] = False  # comparison: draw every model, not just the best
+    uncertainty: Optional[str] = "hessian"  # hessian | montecarlo | bootstrap
     title: Optional[str] = "Ajuste"
     xlabel: Optional[str] = "Eje X"
     ylabel: Optional[str] = "Eje Y"
 
+class ProfileRequest(FitData):
+    model: Optional[str] = "linear"  # a registered model ("auto" isn't supported here)
+    render: Optional[str] = "none"
+    params: Optional[List[str]] = None  # 1-D profiles; default every parameter
+    contours: Optional[List[List[str]]] = []  # parameter pairs for 2-D delta chi2 maps
+    points: Optional[int] = likelihood.PROFILE_POINTS
+    grid: Optional[int] = likelihood.CONTOUR_GRID
+    span: Optional[float] = likelihood.SPAN  # half-width of the scan, in Hessian sigmas
+
+class BatchFitItem(FitRequest):
+    render: Optional[str] = "none"
+    image: Optional[bool] = False  # legacy: same as render="png"
+
+class FitBatchRequest(BaseModel):
+    datasets: List[BatchFitItem]
+
 class GaussRequest(BaseModel):
-    values: List[float]
+    values: ArrayField = None
+    dataset_id: Optional[str] = None
+    column: Optional[str] = "x"
+    render: Optional[str] = "png"
+    fit: Optional[bool] = False  # binned-likelihood Gaussian fit of the histogram
+
+GAUSS_STREAM_MAX_BINS = 10_000  # the histogram is allocated up front
+
+class GaussStreamRequest(BaseModel):
+    bins: Optional[int] = Field(20, ge=0, le=GAUSS_STREAM_MAX_BINS)  # 0: no histogram
+    range: Optional[List[float]] = None
+
+class GaussChunkRequest(BaseModel):
+    values: ArrayField = None
+
+class SessionPoints(BaseModel):
+    x: ArrayField = None
+    y: ArrayField = None
+    dx: ArrayField = None
+    dy: ArrayField = None
+
+class SessionUpdate(SessionPoints):
+    index: List[int]
+
+class FitSessionEdit(BaseModel):
+    """Applied in order: update, remove, add. Indices refer to the points
+    as they were before this request."""
+    update: Optional[SessionUpdate] = None
+    remove: Optional[List[int]] = None
+    add: Optional[SessionPoints] = None
+    render: Optional[str] = "none"
+
+@app.middleware("http")
+async def compress_json(request: Request, call_next):
+    response = await call_next(request)
+    encoding = compression.choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is None or not compression.should_compress(response.headers):
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = dict(response.headers)
+    headers.pop("content-length", None)
+    if len(body) >= compression.COMPRESS_MIN_BYTES:
+        body = compression.compress(body, encoding)
+        headers["content-encoding"] = encoding
+        headers["vary"] = compression.add_vary(headers.get("vary"))
+    return Response(content=body, status_code=response.status_code, headers=headers)
+
+# Registered last, so it is the outermost middleware: its timings cover
+# compression too and the sizes are those of the body actually sent.
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    token = metrics.iniciar_peticion()
+    t0 = time.perf_counter()
+    finish = metrics.perfil_si_lento(asyncio.get_running_loop(), request.method, request.url.path)
+    response = None
+    try:
+        response = await call_next(request)
+    finally:
+        total = time.perf_counter() - t0
+        timings = metrics.terminar_peticion(token)
+        # Route template rather than the raw path, so ids don't explode the label set
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        status = response.status_code if response is not None else 500
+        metrics.request_seconds.observe(total, request.method, route)
+        metrics.requests_total.inc(1, request.method, route, status)
+        if request.headers.get("content-length", "").isdigit():
+            metrics.request_bytes.observe(int(request.headers["content-length"]), route)
+        if response is not None and response.headers.get("content-length", "").isdigit():
+            metrics.response_bytes.observe(int(response.headers["content-length"]), route)
+        if finish is not None:
+            finish(total)
+    response.headers["Server-Timing"] = metrics.server_timing(timings, total)
+    return response
 
 @app.get("/")
 def read_root():
     return {"message": "SciHispida API running"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(content=metrics.exposition(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/metrics/profiles")
+def get_profiles():
+    """Folded stacks of the most recent sampled slow requests (PROFILE_SAMPLE_RATE)."""
+    return list(metrics.profiles)
+
 @app.post("/api/calculate")
 def calculate(req: CalculationRequest):
     op = req.operation.lower()
@@ -75,137 +225,902 @@ def calculate(req: CalculationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/fit")
-def perform_fit(req: FitRequest):
+def batch_args(req: CalculationBatchRequest):
+    """Validated positional arguments for logic.propagacion_lote."""
+    size = len(req.x)
+    columns = [req.dx, req.y, req.dy, req.n, req.a]
+    if any(c is not None and len(c) != size for c in columns):
+        raise HTTPException(status_code=400, detail="Las listas deben tener la misma longitud")
+    if isinstance(req.operation, list):
+        if len(req.operation) != size:
+            raise HTTPException(status_code=400, detail="Las listas deben tener la misma longitud")
+        ops = req.operation
+    else:
+        ops = [req.operation]
+    if any(op.lower() not in logic.VECTOR_OPS for op in ops):
+        raise HTTPException(status_code=400, detail="Operación inválida")
+    return (req.operation, req.x, req.dx, *(c if c is not None else 0.0 for c in columns[1:]))
+
+@app.post("/api/calculate/batch")
+def calculate_batch(req: CalculationBatchRequest):
+    args = batch_args(req)
+    mc = propagation_method(req.method)
+    try:
+        result = logic.propagacion_lote(*args)
+        if mc:
+            result["montecarlo"] = montecarlo.propagacion_montecarlo(
+                *args, samples=req.samples, confidence=req.confidence, seed=req.seed)
+        return result
+    except montecarlo.MCError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def propagation_method(method):
+    """True for Monte Carlo propagation, False for first-order."""
+    method = (method or "linear").lower()
+    if method not in ("linear", "montecarlo"):
+        raise HTTPException(status_code=400, detail="method inválido (usa linear o montecarlo)")
+    return method == "montecarlo"
+
+@app.post("/api/formula")
+def evaluate_formula(req: FormulaRequest):
+    mc = propagation_method(req.method)
+    try:
+        result = formula.evaluar_formula(req.formula, req.values, req.uncertainties or {})
+        if mc:
+            result["montecarlo"] = montecarlo.formula_montecarlo(
+                req.formula, req.values, req.uncertainties or {},
+                samples=req.samples, confidence=req.confidence, seed=req.seed)
+        return result
+    except (formula.FormulaError, montecarlo.MCError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def load_dataset(dataset_id):
+    try:
+        return datasets.get_store().get(dataset_id)
+    except datasets.DatasetNotFound:
+        raise HTTPException(status_code=404, detail="Dataset no encontrado o expirado")
+
+def decode(value):
     try:
-        if not (len(req.x) == len(req.y) == len(req.dx) == len(req.dy)):
+        return codec.as_array(value)
+    except codec.CodecError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def fit_arrays(req):
+    """(x, y, dx, dy, content key) from inline lists or a stored dataset."""
+    if req.dataset_id:
+        cols = load_dataset(req.dataset_id)
+        x, y, dx, dy = cols['x'], cols['y'], cols['dx'], cols['dy']
+        key = req.dataset_id
+    else:
+        if req.x is None or req.y is None or req.dx is None or req.dy is None:
+            raise HTTPException(status_code=400, detail="Faltan datos: envía x, y, dx, dy o dataset_id")
+        x, y, dx, dy = (decode(c) for c in (req.x, req.y, req.dx, req.dy))
+        if not (len(x) == len(y) == len(dx) == len(dy)):
             raise HTTPException(status_code=400, detail="Las listas deben tener la misma longitud")
-        if len(req.x) < 2:
-            raise HTTPException(status_code=400, detail="Se necesitan al menos 2 puntos")
+        key = cache.array_key(x, y, dx, dy)
+    if len(x) < 2:
+        raise HTTPException(status_code=400, detail="Se necesitan al menos 2 puntos")
+    return x, y, dx, dy, key
 
-        model_type = req.model or "linear"
-        if model_type == "quadratic":
-            func = logic.funcion_cuadratica
-        elif model_type == "exponential":
-            func = logic.funcion_exponencial
-        else:
-            func = logic.funcion_lineal
-
-        stats = logic.funcionChi2(
-            np.array(req.x, dtype=float),
-            np.array(req.y, dtype=float),
-            np.array(req.dy, dtype=float),
-            func,
-            model_type=model_type
-        )
-
-        plot_data = {
-            'x': req.x,
-            'y': req.y,
-            'dx': req.dx,
-            'dy': req.dy,
-            'params': stats['params'],
-            'chi2_ndof': stats['chi2_ndof'],
-            'title': req.title,
-            'xlabel': req.xlabel,
-            'ylabel': req.ylabel,
-        }
+def render_mode(render):
+    mode = (render or "png").lower()
+    if mode not in logic.RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"render inválido (usa {', '.join(logic.RENDER_MODES)})")
+    return mode
 
-        img_base64 = logic.graf_plot(plot_data, model_type=model_type)
+def curve_encoding(encoding):
+    """Check the fitted-curve dtype up front (400), before anything is fitted."""
+    if encoding and encoding.lower() not in codec.DTYPES:
+        raise HTTPException(status_code=400, detail=f"encoding no soportado: {encoding} (usa f8 o f4)")
+    return encoding
 
-        return {
-            "stats": stats,
-            "image": img_base64
+def not_modified(request: Request, etag: str):
+    """304 response if the client already holds this ETag, else None."""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+def compared_models(req):
+    """Model names to fit and rank, or None for a single-model fit."""
+    if req.models:
+        names = list(dict.fromkeys(req.models))
+    elif (req.model or "").lower() == "auto":
+        names = list(logic.MODELOS)
+    else:
+        return None
+    unknown = [name for name in names if name not in logic.MODELOS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Modelo desconocido: {', '.join(unknown)}")
+    return names
+
+def attach_plot(result, req, plot_data, model_type, render, result_id, image_key):
+    """Add the image, chart data and/or encoded curve to a fit result and
+    remember the plot spec for /api/image."""
+    if render in ("png", "svg"):
+        image = cache.image_cache.get(image_key)
+        if image is None:
+            image = logic.renderizar(logic.graf_plot, plot_data, model_type=model_type, fmt=render)
+            cache.image_cache.put(image_key, image)
+        result["image"] = image
+        result["image_format"] = render
+    elif render == "data":
+        result["plot"] = logic.datos_ajuste(plot_data, model_type)
+    cache.plot_specs.put(result_id, {"kind": "fit", "data": plot_data, "model_type": model_type})
+
+    if req.encoding:
+        x_fit, y_fit, _ = logic.curva_ajuste(plot_data['x'], plot_data['params'], model_type)
+        result["curve"] = {
+            "x_fit": codec.encode_b64(x_fit, req.encoding),
+            "y_fit": codec.encode_b64(y_fit, req.encoding),
         }
+    return result
+
+def plot_fields(req, x, y, dx, dy, stats):
+    return {
+        'x': x,
+        'y': y,
+        'dx': dx,
+        'dy': dy,
+        'params': stats['params'],
+        'chi2_ndof': stats['chi2_ndof'],
+        'title': req.title,
+        'xlabel': req.xlabel,
+        'ylabel': req.ylabel,
+    }
+
+@app.post("/api/fit")
+def perform_fit(req: FitRequest, request: Request, response: Response):
+    metrics.desde_inicio("parse")
+    try:
+        with metrics.etapa("decode"):
+            x, y, dx, dy, data_key = fit_arrays(req)
+        render = render_mode(req.render)
+        curve_encoding(req.encoding)
+        names = compared_models(req)
+        if names is not None:
+            return compare_fit(req, request, response, x, y, dx, dy, data_key, names, render)
+        model_type = req.model or "linear"
+        func = logic.modelo(model_type)
+        uncertainty = uncertainty_method(req.uncertainty)
+
+        # Stats depend on the data and model only; the image also on the labels
+        fit_key = cache.derived_key(data_key, model_type)
+        if req.use_dx:
+            fit_key = cache.derived_key(fit_key, "eiv")
+        result_id = cache.derived_key(fit_key, req.title, req.xlabel, req.ylabel)
+        image_key = cache.derived_key(result_id, logic.PLOT_DPI, render)
+        etag_key = cache.derived_key(image_key, req.encoding) if req.encoding else image_key
+        if uncertainty != "hessian":
+            etag_key = cache.derived_key(etag_key, uncertainty, req.samples, req.confidence, req.seed)
+        etag = f'"{etag_key}"'
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        stats = cache.fit_cache.get(fit_key)
+        if stats is None:
+            stats = logic.funcionChi2(x, y, dy, func, model_type=model_type, xerr=dx if req.use_dx else None)
+            cache.fit_cache.put(fit_key, stats)
+        if uncertainty != "hessian":
+            stats = dict(stats, montecarlo=fit_montecarlo(req, x, y, dx, dy, model_type, stats, fit_key, uncertainty))
+
+        result = {"stats": stats, "result_id": result_id, "image_url": f"/api/image/{result_id}"}
+        attach_plot(result, req, plot_fields(req, x, y, dx, dy, stats), model_type, render, result_id, image_key)
+        response.headers["ETag"] = etag
+        return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# ========== FILE UPLOAD (CSV/Excel) ==========
+def uncertainty_method(method):
+    method = (method or "hessian").lower()
+    if method != "hessian" and method not in montecarlo.METHODS:
+        raise HTTPException(status_code=400, detail=f"uncertainty inválido (usa hessian, {', '.join(montecarlo.METHODS)})")
+    return method
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Parse CSV or Excel file with columns: X, Y, EX (or DX), EY (or DY).
-    Returns parsed data as JSON arrays."""
-    try:
-        contents = await file.read()
-        filename = file.filename.lower()
+def fit_montecarlo(req, x, y, dx, dy, model_type, stats, fit_key, method):
+    """Monte Carlo / bootstrap parameter intervals, cached with the fit.
+    Replicas needing Minuit are spread over the fit pool."""
+    key = cache.derived_key(fit_key, method, req.samples, req.confidence, req.seed)
+    summary = cache.fit_cache.get(key)
+    if summary is None:
+        try:
+            summary = montecarlo.ajuste_montecarlo(
+                np.asarray(x), np.asarray(y), np.asarray(dx), np.asarray(dy),
+                logic.obtener_modelo(model_type).name, stats, method,
+                samples=req.samples, confidence=req.confidence, seed=req.seed,
+                executor=get_fit_pool(), workers=fit_workers(), use_dx=bool(req.use_dx),
+            )
+        except montecarlo.MCError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        cache.fit_cache.put(key, summary)
+    return summary
 
-        if filename.endswith('.csv') or filename.endswith('.txt'):
-            # Try comma, semicolon, tab separators
-            for sep in [',', ';', '\t']:
-                try:
-                    df = pd.read_csv(io.BytesIO(contents), sep=sep)
-                    if len(df.columns) >= 2:
-                        break
-                except:
-                    continue
-        elif filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(contents))
+def compare_fit(req, request, response, x, y, dx, dy, data_key, names, render):
+    """Fit several models on the same prepared arrays, concurrently, and rank
+    them; only the best model (or one overlaid figure) is rendered."""
+    overlay = bool(req.overlay)
+    use_dx = bool(req.use_dx)
+    result_id = cache.derived_key(data_key, "compare", tuple(names), overlay, use_dx, req.title, req.xlabel, req.ylabel)
+    image_key = cache.derived_key(result_id, logic.PLOT_DPI, render)
+    etag = f'"{cache.derived_key(image_key, req.encoding) if req.encoding else image_key}"'
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    # Ranked fits are validated (see logic.ajustar_modelo), so they are cached
+    # apart from single-model stats
+    fits, errors = {}, {}
+    missing = []
+    for name in names:
+        stats = cache.fit_cache.get(cache.derived_key(data_key, name, "ranked", use_dx))
+        if stats is None:
+            missing.append(name)
         else:
-            raise HTTPException(status_code=400, detail="Formato no soportado. Usa CSV, TXT, o Excel (.xlsx)")
-
-        # Normalize column names
-        df.columns = [c.strip().upper() for c in df.columns]
-
-        # Try to map columns
-        col_map = {}
-        for col in df.columns:
-            if col in ['X']:
-                col_map['x'] = col
-            elif col in ['Y']:
-                col_map['y'] = col
-            elif col in ['EX', 'DX', 'ΔX', 'DELTAX', 'ERROR_X', 'XERR']:
-                col_map['dx'] = col
-            elif col in ['EY', 'DY', 'ΔY', 'DELTAY', 'ERROR_Y', 'YERR']:
-                col_map['dy'] = col
-
-        # Fallback: use positional columns if not found by name
-        cols = list(df.columns)
-        if 'x' not in col_map and len(cols) >= 1:
-            col_map['x'] = cols[0]
-        if 'y' not in col_map and len(cols) >= 2:
-            col_map['y'] = cols[1]
-        if 'dx' not in col_map and len(cols) >= 3:
-            col_map['dx'] = cols[2]
-        if 'dy' not in col_map and len(cols) >= 4:
-            col_map['dy'] = cols[3]
-
-        if 'x' not in col_map or 'y' not in col_map:
-            raise HTTPException(status_code=400, detail="No se encontraron columnas X e Y")
-
-        result = {
-            "x": df[col_map['x']].astype(float).tolist(),
-            "y": df[col_map['y']].astype(float).tolist(),
-            "dx": df[col_map.get('dx', col_map['x'])].astype(float).tolist() if 'dx' in col_map else [0.0] * len(df),
-            "dy": df[col_map.get('dy', col_map['y'])].astype(float).tolist() if 'dy' in col_map else [0.0] * len(df),
-            "columns_found": list(col_map.keys()),
-            "n_rows": len(df),
-        }
-        return result
+            fits[name] = stats
+    if missing:
+        executor = get_fit_pool() if len(missing) > 1 else None
+        new, errors = logic.comparar_modelos(np.asarray(x), np.asarray(y), np.asarray(dy), missing, executor,
+                                              xerr=np.asarray(dx) if use_dx else None)
+        for name, stats in new.items():
+            cache.fit_cache.put(cache.derived_key(data_key, name, "ranked", use_dx), stats)
+        fits.update(new)
+    if not fits:
+        raise HTTPException(status_code=400, detail={"message": "Ningún modelo pudo ajustarse", "errors": errors})
+
+    ranking = logic.ranking_modelos(fits, len(x))
+    best = ranking[0]["model"]
+    result = {
+        "model": best,
+        "stats": fits[best],
+        "ranking": ranking,
+        "errors": errors,
+        "result_id": result_id,
+        "image_url": f"/api/image/{result_id}",
+    }
+    plot_data = plot_fields(req, x, y, dx, dy, fits[best])
+    if overlay:
+        plot_data['overlay'] = [
+            {"model_type": e["model"], "params": e["params"], "chi2_ndof": e["chi2_ndof"]}
+            for e in ranking[1:]
+        ]
+    attach_plot(result, req, plot_data, best, render, result_id, image_key)
+    response.headers["ETag"] = etag
+    return result
+
+async def read_binary_columns(request: Request, columns, dtype):
+    """Columns from an octet-stream or Arrow IPC body."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    body = await request.body()
+    try:
+        if content_type == codec.ARROW_STREAM:
+            return codec.decode_arrow(body)
+        if content_type == codec.OCTET_STREAM:
+            return codec.decode_raw(body, columns, dtype)
+    except codec.CodecError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    raise HTTPException(status_code=415, detail=f"Content-Type no soportado (usa {codec.OCTET_STREAM} o {codec.ARROW_STREAM})")
+
+@app.post("/api/fit/raw")
+async def perform_fit_raw(request: Request, response: Response, model: str = "linear", dtype: str = "f8",
+                          title: str = "Ajuste", xlabel: str = "Eje X", ylabel: str = "Eje Y",
+                          encoding: Optional[str] = None, render: str = "png", use_dx: bool = False):
+    """/api/fit with a binary body: either x, y, dx, dy as consecutive
+    little-endian blocks (octet-stream) or an Arrow table with those columns.
+    Missing dx/dy columns in Arrow input default to zeros."""
+    cols = await read_binary_columns(request, datasets.COLUMNS, dtype)
+    if 'x' not in cols or 'y' not in cols:
+        raise HTTPException(status_code=400, detail="No se encontraron columnas X e Y")
+    zeros = np.zeros(len(cols['x']))
+    req = FitRequest.model_construct(
+        x=cols['x'], y=cols['y'], dx=cols.get('dx', zeros), dy=cols.get('dy', zeros),
+        encoding=encoding, render=render, model=model, title=title, xlabel=xlabel, ylabel=ylabel,
+        use_dx=use_dx,
+    )
+    return await run_in_threadpool(perform_fit, req, request, response)
 
+@app.post("/api/fit/profile")
+def fit_profile(req: ProfileRequest, request: Request, response: Response):
+    """Profile-likelihood scans (MINOS-like intervals) and 2-D confidence
+    contours around the best fit, cached per dataset/model/scan."""
+    metrics.desde_inicio("parse")
+    try:
+        with metrics.etapa("decode"):
+            x, y, dx, dy, data_key = fit_arrays(req)
+        render = render_mode(req.render)
+        model_type = req.model or "linear"
+        if model_type.lower() == "auto":
+            raise HTTPException(status_code=400, detail="Los perfiles necesitan un modelo concreto, no auto")
+        if model_type not in logic.MODELOS:
+            raise HTTPException(status_code=400, detail=f"Modelo desconocido: {model_type}")
+        # Same key as /api/fit, so the nominal fit is shared
+        fit_key = cache.derived_key(data_key, model_type)
+        if req.use_dx:
+            fit_key = cache.derived_key(fit_key, "eiv")
+        contours = tuple(tuple(pair) for pair in (req.contours or ()))
+        params = tuple(req.params) if req.params is not None else None
+        result_id = cache.derived_key(fit_key, "profile", params, contours, req.points, req.grid, req.span)
+        image_key = cache.derived_key(result_id, logic.PLOT_DPI, render)
+        etag = f'"{image_key}"'
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        result = cache.fit_cache.get(result_id)
+        if result is None:
+            stats = cache.fit_cache.get(fit_key)
+            if stats is None:
+                stats = logic.funcionChi2(x, y, dy, logic.modelo(model_type), model_type=model_type,
+                                          xerr=dx if req.use_dx else None)
+                cache.fit_cache.put(fit_key, stats)
+            mod = logic.MODELOS[model_type]
+            yerr = np.asarray(dy, dtype=float)
+            if req.use_dx:
+                # Profile the chi2 with the effective-variance weights at the
+                # errors-in-variables optimum, the ones its Hessian comes from
+                values = [stats['params'][p]['value'] for p in mod.params]
+                yerr = logic.dy_efectiva(np.asarray(x, dtype=float), np.asarray(dx, dtype=float), yerr, mod, values)
+            # Minuit grid rows go to the process pool; the vectorized paths don't need it
+            executor = get_fit_pool() if mod.design is None else None
+            result = likelihood.perfiles(
+                np.asarray(x), np.asarray(y), yerr, model_type, stats,
+                params=params, contours=contours, points=req.points, grid=req.grid, span=req.span,
+                executor=executor,
+            )
+            cache.fit_cache.put(result_id, result)
+
+        result = dict(result, result_id=result_id, image_url=f"/api/image/{result_id}")
+        if render in ("png", "svg"):
+            image = cache.image_cache.get(image_key)
+            if image is None:
+                image = logic.renderizar(likelihood.perfil_plot, result, fmt=render)
+                cache.image_cache.put(image_key, image)
+            result["image"] = image
+            result["image_format"] = render
+        cache.plot_specs.put(result_id, {"kind": "profile", "result": result})
+        response.headers["ETag"] = etag
+        return result
     except HTTPException:
         raise
+    except ValueError as e:
+        # likelihood.ProfileError included
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/models")
+def list_models():
+    return {"models": [m.info() for m in logic.MODELOS.values()]}
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return cache.all_stats()
+
+# ========== BATCH FIT ==========
+
+_fit_pool = None
+
+def fit_workers():
+    workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    return workers or 1
+
+def get_fit_pool():
+    """Process pool sized to the available cores, created on first use.
+
+    Falls back to threads where processes can't be spawned (some serverless
+    runtimes lack working semaphores).
+    """
+    global _fit_pool
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    if _fit_pool is None:
+        try:
+            _fit_pool = ProcessPoolExecutor(max_workers=fit_workers())
+        except (OSError, NotImplementedError):
+            _fit_pool = ThreadPoolExecutor(max_workers=fit_workers())
+    return _fit_pool
+
+@app.post("/api/fit/batch")
+async def perform_fit_batch(req: FitBatchRequest):
+    """Fit N datasets in parallel; results are streamed as NDJSON in
+    completion order, each line tagged with the dataset index."""
+    loop = asyncio.get_running_loop()
+    pool = get_fit_pool()
+
+    async def run(index, item):
+        try:
+            x, y, dx, dy, _ = fit_arrays(item)
+            render = "png" if item.image else render_mode(item.render)
+            data = {
+                'x': x, 'y': y, 'dx': dx, 'dy': dy,
+                'title': item.title, 'xlabel': item.xlabel, 'ylabel': item.ylabel,
+            }
+            result = await loop.run_in_executor(
+                pool, logic.ajustar_dataset, data, item.model or "linear", render, bool(item.use_dx))
+            return {"index": index, **result}
+        except HTTPException as e:
+            return {"index": index, "error": e.detail}
+        except Exception as e:
+            return {"index": index, "error": str(e)}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(req.datasets)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# ========== FIT SESSIONS ==========
+# Interactive editing: the dataset and its last fit stay server-side, and
+# each point-level edit refits from there (see logic.SesionAjuste).
+
+FIT_SESSION_MAX_POINTS = int(os.environ.get("FIT_SESSION_MAX_POINTS", 1_000_000))
+# Total point arrays held across sessions (a full session is 32 MB); the
+# least recently used sessions are dropped beyond it
+FIT_SESSION_MAX_BYTES = int(os.environ.get("FIT_SESSION_MAX_BYTES", 512 * 1024 * 1024))
+
+fit_sessions = cache.SessionStore(max_entries=256, ttl=1800, max_bytes=FIT_SESSION_MAX_BYTES,
+                                  sizeof=lambda entry: entry[0].nbytes)
+
+def get_fit_session(session_id):
+    entry = fit_sessions.get(session_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
+    return entry
+
+def session_result(session_id, session, labels, render):
+    result = {"session_id": session_id, "n": len(session), "stats": session.stats}
+    if render in ("png", "svg"):
+        plot_data = dict(session.plot_data(), **labels)
+        result["image"] = logic.renderizar(logic.graf_plot, plot_data, model_type=session.model_type, fmt=render)
+        result["image_format"] = render
+    elif render == "data":
+        result["plot"] = logic.datos_ajuste(session.plot_data(), session.model_type)
+    return result
+
+def session_columns(points, n=None):
+    """Decoded x/y/dx/dy of an edit; all present columns share one length."""
+    cols = {k: decode(getattr(points, k)) for k in datasets.COLUMNS if getattr(points, k) is not None}
+    lengths = {len(c) for c in cols.values()} | ({n} if n is not None else set())
+    if len(lengths) > 1:
+        raise HTTPException(status_code=400, detail="Las listas deben tener la misma longitud")
+    return cols
+
+@app.post("/api/fit/session")
+def fit_session_open(req: FitRequest):
+    x, y, dx, dy, _ = fit_arrays(req)
+    render = render_mode(req.render)
+    if len(x) > FIT_SESSION_MAX_POINTS:
+        raise HTTPException(status_code=413, detail=f"Máximo {FIT_SESSION_MAX_POINTS} puntos por sesión")
+    session = logic.SesionAjuste(x, y, dx, dy, req.model or "linear")
+    try:
+        session.ajustar()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    labels = {'title': req.title, 'xlabel': req.xlabel, 'ylabel': req.ylabel}
+    session_id = fit_sessions.create((session, threading.Lock(), labels))
+    return session_result(session_id, session, labels, render)
+
+@app.post("/api/fit/session/{session_id}")
+def fit_session_edit(session_id: str, req: FitSessionEdit):
+    session, lock, labels = get_fit_session(session_id)
+    render = render_mode(req.render)
+    update = session_columns(req.update, len(req.update.index)) if req.update else None
+    add = session_columns(req.add) if req.add else None
+    if add is not None and set(add) != set(datasets.COLUMNS):
+        raise HTTPException(status_code=400, detail="Para añadir puntos envía x, y, dx y dy")
+    with lock:
+        n_after = len(session) - len(set(req.remove or ())) + (len(add['x']) if add else 0)
+        if n_after > FIT_SESSION_MAX_POINTS:
+            raise HTTPException(status_code=413, detail=f"Máximo {FIT_SESSION_MAX_POINTS} puntos por sesión")
+        try:
+            session.actualizar(
+                update=(req.update.index, update) if update is not None else None,
+                remove=req.remove,
+                add=add,
+            )
+        except (IndexError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        fit_sessions.resize(session_id)
+        return session_result(session_id, session, labels, render)
+
+@app.get("/api/fit/session/{session_id}")
+def fit_session_get(session_id: str, render: str = "none"):
+    session, lock, labels = get_fit_session(session_id)
+    render = render_mode(render)
+    with lock:
+        return session_result(session_id, session, labels, render)
+
+@app.delete("/api/fit/session/{session_id}")
+def fit_session_close(session_id: str):
+    session, lock, labels = get_fit_session(session_id)
+    fit_sessions.pop(session_id)
+    with lock:
+        return {"session_id": session_id, "n": len(session), "stats": session.stats}
+
+# ========== FILE UPLOAD (CSV/Excel) ==========
+
+UPLOAD_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"],
+    "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
+
+@app.post("/api/upload", openapi_extra=UPLOAD_BODY)
+async def upload_file(request: Request, inline: bool = True):
+    """Parse CSV or Excel file (multipart field ``file``) with columns: X, Y,
+    EX (or DX), EY (or DY). The body is streamed straight to disk (see
+    ingest.recibir_upload). The table is stored server-side and its
+    dataset_id returned, so it can be fitted by reference; with inline=false
+    the arrays are not echoed back."""
+    path = None
+    try:
+        metrics.desde_inicio("receive")
+        with metrics.etapa("spool"):
+            path, filename = await ingest.recibir_upload(request.stream(), request.headers)
+        with metrics.etapa("parse_table"):
+            table = await asyncio.to_thread(ingest.leer_tabla, path, filename)
+        with metrics.etapa("store"):
+            table["dataset_id"] = datasets.get_store().put(
+                table['x'], table['y'], table['dx'], table['dy'],
+                meta={"filename": filename, "columns_found": table['columns_found']},
+            )
+        if not inline:
+            for key in datasets.COLUMNS:
+                del table[key]
+        return {
+            k: v.tolist() if isinstance(v, np.ndarray) else v
+            for k, v in table.items()
+        }
+    except ingest.IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al leer archivo: {str(e)}")
+    finally:
+        if path is not None:
+            os.remove(path)
 
 # ========== GAUSS ==========
 
+def gauss_values(req: GaussRequest):
+    """(values, content key) from inline values or a stored dataset column."""
+    if req.dataset_id:
+        if req.column not in datasets.COLUMNS:
+            raise HTTPException(status_code=400, detail="Columna inválida")
+        values = load_dataset(req.dataset_id)[req.column]
+        key = cache.derived_key(req.dataset_id, req.column)
+    elif req.values is not None:
+        with metrics.etapa("decode"):
+            values = decode(req.values)
+        key = cache.array_key(values)
+    else:
+        raise HTTPException(status_code=400, detail="Faltan datos: envía values o dataset_id")
+    if len(values) < 2:
+        raise HTTPException(status_code=400, detail="Se necesitan al menos 2 datos")
+    return values, key
+
 @app.post("/api/gauss")
-def gauss_analysis(req: GaussRequest):
+def gauss_analysis(req: GaussRequest, request: Request, response: Response):
+    metrics.desde_inicio("parse")
     try:
-        if len(req.values) < 2:
-            raise HTTPException(status_code=400, detail="Se necesitan al menos 2 datos")
-        result = logic.fgaus(req.values)
-        img_base64 = logic.gauss_plot(req.values)
-        result["image"] = img_base64
+        values, gauss_key = gauss_values(req)
+        render = render_mode(req.render)
+        if req.fit:
+            gauss_key = cache.derived_key(gauss_key, "fit")
+        result_id = gauss_key
+        image_key = cache.derived_key(result_id, logic.PLOT_DPI, render)
+        etag = f'"{image_key}"'
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+
+        stats = cache.gauss_cache.get(gauss_key)
+        if stats is None:
+            with metrics.etapa("gauss_stats"):
+                stats = logic.fgaus(values)
+            if req.fit:
+                with metrics.etapa("gauss_fit"):
+                    try:
+                        stats = dict(stats, fit=logic.ajuste_gauss(values, stats))
+                    except ValueError as e:
+                        raise HTTPException(status_code=400, detail=str(e))
+            cache.gauss_cache.put(gauss_key, stats)
+
+        result = dict(stats, result_id=result_id, image_url=f"/api/image/{result_id}")
+        if render in ("png", "svg"):
+            image = cache.image_cache.get(image_key)
+            if image is None:
+                image = logic.renderizar(logic.gauss_plot, values, stats, fmt=render)
+                cache.image_cache.put(image_key, image)
+            result["image"] = image
+            result["image_format"] = render
+        elif render == "data":
+            result["plot"] = logic.datos_gauss(values, stats)
+        cache.plot_specs.put(result_id, {"kind": "gauss", "values": values, "stats": stats})
+
+        response.headers["ETag"] = etag
         return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/gauss/raw")
+async def gauss_analysis_raw(request: Request, response: Response, dtype: str = "f8", render: str = "png",
+                             fit: bool = False):
+    """/api/gauss with the sample as a raw little-endian buffer or a
+    single-column Arrow table."""
+    cols = await read_binary_columns(request, ["values"], dtype)
+    req = GaussRequest.model_construct(values=next(iter(cols.values())), render=render, fit=fit)
+    return await run_in_threadpool(gauss_analysis, req, request, response)
+
+# ========== IMAGES ==========
+
+IMAGE_DPI_RANGE = (30, 600)
+IMAGE_SIZE_RANGE = (1.0, 40.0)
+
+def negotiate_image(accept):
+    """Pick png/webp/svg from an Accept header (q-values honoured, png default)."""
+    best, best_q = "png", 0.0
+    for part in (accept or "").split(","):
+        media, _, params = part.strip().partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        fmt = next((f for f, t in logic.IMAGE_TYPES.items() if t == media), None)
+        if fmt is not None and q > best_q:
+            best, best_q = fmt, q
+    return best
+
+@app.get("/api/image/{result_id}")
+def get_image(result_id: str, request: Request, format: Optional[str] = None,
+              dpi: int = logic.PLOT_DPI, width: Optional[float] = None, height: Optional[float] = None):
+    """Raw image for a previous /api/fit or /api/gauss result.
+
+    The format comes from ``format`` or the Accept header. Result ids are
+    content hashes, so the response is cacheable forever.
+    """
+    fmt = (format or negotiate_image(request.headers.get("accept"))).lower()
+    if fmt not in logic.IMAGE_TYPES:
+        raise HTTPException(status_code=400, detail="Formato no soportado (usa png, webp o svg)")
+    if not IMAGE_DPI_RANGE[0] <= dpi <= IMAGE_DPI_RANGE[1]:
+        raise HTTPException(status_code=400, detail=f"dpi fuera de rango {IMAGE_DPI_RANGE}")
+    for side in (width, height):
+        if side is not None and not IMAGE_SIZE_RANGE[0] <= side <= IMAGE_SIZE_RANGE[1]:
+            raise HTTPException(status_code=400, detail=f"Tamaño fuera de rango {IMAGE_SIZE_RANGE} (pulgadas)")
+
+    spec = cache.plot_specs.get(result_id)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Resultado no encontrado o expirado")
+
+    default_size = {"fit": (10, 6), "gauss": (8, 5)}.get(spec["kind"])
+    if default_size is None:
+        # Profile figures size themselves by their number of panels
+        size = (width, height) if width and height else None
+    else:
+        size = (width or default_size[0], height or default_size[1])
+    key = cache.derived_key(result_id, "raw", fmt, dpi, size)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    image = cache.image_cache.get(key)
+    if image is None:
+        try:
+            if spec["kind"] == "fit":
+                image = logic.renderizar(logic.graf_plot, spec["data"], model_type=spec["model_type"],
+                                         fmt=fmt, dpi=dpi, size=size, raw=True)
+            elif spec["kind"] == "profile":
+                image = logic.renderizar(likelihood.perfil_plot, spec["result"],
+                                         fmt=fmt, dpi=dpi, size=size, raw=True)
+            else:
+                image = logic.renderizar(logic.gauss_plot, spec["values"], spec["stats"],
+                                         fmt=fmt, dpi=dpi, size=size, raw=True)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        cache.image_cache.put(key, image)
+    return Response(content=image, media_type=logic.IMAGE_TYPES[fmt], headers=headers)
+
+# ========== STREAMING GAUSS ==========
+# Running statistics for samples too large for one request: open a stream,
+# send chunks (JSON/base64 or a raw octet-stream body read incrementally),
+# read the merged result at any point.
+
+gauss_streams = cache.SessionStore(max_entries=256, ttl=3600)
+
+def get_gauss_stream(stream_id):
+    entry = gauss_streams.get(stream_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Stream no encontrado o expirado")
+    return entry
+
+@app.post("/api/gauss/stream")
+def gauss_stream_open(req: GaussStreamRequest):
+    if req.range is not None and (len(req.range) != 2 or req.range[0] >= req.range[1]):
+        raise HTTPException(status_code=400, detail="range debe ser [min, max] con min < max")
+    acc = logic.GaussAcumulador(bins=req.bins or 0, range_=req.range)
+    return {"stream_id": gauss_streams.create((acc, threading.Lock()))}
+
+@app.post("/api/gauss/stream/{stream_id}")
+def gauss_stream_chunk(stream_id: str, req: GaussChunkRequest):
+    acc, lock = get_gauss_stream(stream_id)
+    values = decode(req.values) if req.values is not None else np.empty(0)
+    with lock:
+        acc.update(values)
+        return acc.to_dict()
+
+@app.post("/api/gauss/stream/{stream_id}/raw")
+async def gauss_stream_raw(stream_id: str, request: Request, dtype: str = "f8"):
+    """Consume a raw little-endian body chunk by chunk as it arrives."""
+    acc, lock = get_gauss_stream(stream_id)
+    try:
+        itemsize = np.dtype(codec.DTYPES[dtype.lower()]).itemsize
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"dtype no soportado: {dtype} (usa f8 o f4)")
+    pending = b""
+    async for part in request.stream():
+        pending += part
+        usable = len(pending) - len(pending) % itemsize
+        if usable:
+            values = codec.decode_raw(pending[:usable], ["values"], dtype)["values"]
+            with lock:
+                acc.update(values)
+            pending = pending[usable:]
+    if pending:
+        raise HTTPException(status_code=400, detail="El tamaño del buffer no es múltiplo del dtype")
+    with lock:
+        return acc.to_dict()
+
+@app.get("/api/gauss/stream/{stream_id}")
+def gauss_stream_result(stream_id: str, fit: bool = False):
+    """Running statistics and histogram; with fit=true, also the
+    binned-likelihood Gaussian fit of the accumulated counts."""
+    acc, lock = get_gauss_stream(stream_id)
+    with lock:
+        result = acc.to_dict()
+        if fit:
+            try:
+                result["fit"] = acc.ajuste()
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        return result
+
+@app.delete("/api/gauss/stream/{stream_id}")
+def gauss_stream_close(stream_id: str):
+    acc, lock = get_gauss_stream(stream_id)
+    gauss_streams.pop(stream_id)
+    with lock:
+        return acc.to_dict()
+
+# ========== JOBS ==========
+# Fits, Gauss analyses and propagations as background jobs (see jobs.py): the
+# request validates and enqueues; the result is polled or streamed. jobs.py
+# (and multiprocessing with it) is imported on first use, off the cold start.
+
+JOB_POLL_INTERVAL = 0.25
+
+def montecarlo_options(req, enabled):
+    """samples/confidence/seed for a job payload, checked before enqueueing
+    so bad values are a 400 rather than a failed job."""
+    if enabled:
+        try:
+            montecarlo.validar_opciones(req.samples, req.confidence)
+        except montecarlo.MCError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"samples": req.samples, "confidence": req.confidence, "seed": req.seed}
+
+def submit_job(kind, payload, timeout):
+    import jobs
+    try:
+        job_id = jobs.get_queue().submit(kind, payload, timeout)
+    except jobs.JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events",
+    }
+
+@app.post("/api/jobs/fit", status_code=202)
+def fit_job(req: FitRequest, timeout: Optional[float] = None):
+    x, y, dx, dy, _ = fit_arrays(req)
+    uncertainty = uncertainty_method(req.uncertainty)
+    return submit_job("fit", {
+        'x': np.array(x), 'y': np.array(y), 'dx': np.array(dx), 'dy': np.array(dy),
+        'model': logic.obtener_modelo(req.model or "linear").name,
+        'models': compared_models(req),
+        'use_dx': bool(req.use_dx),
+        'uncertainty': uncertainty,
+        **montecarlo_options(req, uncertainty != "hessian"),
+        'render': render_mode(req.render),
+        'title': req.title, 'xlabel': req.xlabel, 'ylabel': req.ylabel,
+    }, timeout)
+
+@app.post("/api/jobs/gauss", status_code=202)
+def gauss_job(req: GaussRequest, timeout: Optional[float] = None):
+    values, _ = gauss_values(req)
+    return submit_job("gauss", {"values": np.array(values), "render": render_mode(req.render), "fit": bool(req.fit)},
+                      timeout)
+
+@app.post("/api/jobs/propagation", status_code=202)
+def propagation_job(req: CalculationBatchRequest, timeout: Optional[float] = None):
+    mc = propagation_method(req.method)
+    return submit_job("propagation", {
+        "args": batch_args(req), "montecarlo": mc, **montecarlo_options(req, mc),
+    }, timeout)
+
+@app.post("/api/jobs/formula", status_code=202)
+def formula_job(req: FormulaRequest, timeout: Optional[float] = None):
+    mc = propagation_method(req.method)
+    return submit_job("formula", {
+        "formula": req.formula, "values": req.values, "uncertainties": req.uncertainties or {},
+        "montecarlo": mc, **montecarlo_options(req, mc),
+    }, timeout)
+
+def job_snapshot(job_id, result=True):
+    import jobs
+    try:
+        return jobs.get_queue().get(job_id, result)
+    except jobs.JobNotFound:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status and progress of a job; the result once it is done."""
+    return job_snapshot(job_id)
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """NDJSON stream of the job's state, one line per change, ending with
+    the finished job (and its result)."""
+    import jobs
+    snapshot = job_snapshot(job_id, result=False)
+
+    async def stream():
+        current, last = snapshot, None
+        while True:
+            if current["status"] in jobs.FINISHED:
+                yield json.dumps(job_snapshot(job_id)) + "\n"
+                return
+            state = (current["status"], current["progress"], current["stage"])
+            if state != last:
+                yield json.dumps(current) + "\n"
+                last = state
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            current = job_snapshot(job_id, result=False)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.delete("/api/jobs/{job_id}")
+def job_cancel(job_id: str):
+    """Cancel a queued or running job; finished jobs are left as they are."""
+    import jobs
+    try:
+        return jobs.get_queue().cancel(job_id)
+    except jobs.JobNotFound:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+
+@app.get("/api/jobs")
+def job_stats():
+    import jobs
+    return jobs.get_queue().stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
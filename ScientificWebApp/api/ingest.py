@@ -0,0 +1,278 @@
+import csv
+import os
+import tempfile
+
+import numpy as np
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# ========== UPLOAD INGEST ==========
+#
+# The multipart request body is parsed as it arrives and the file part is
+# written straight to a temporary file (never held whole in memory, nor
+# spooled first by the framework and copied again), counting bytes so an
+# oversized upload is cut off as soon as it passes the limit; a declared
+# Content-Length above it is refused before reading anything. The separator
+# and header are then sniffed from a small prefix, and the file is parsed
+# exactly once reading only the X/Y/DX/DY columns as float64.
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 512 * 1024 * 1024))
+MULTIPART_OVERHEAD = 64 * 1024   # boundaries, part headers and small fields around the file
+
+SEPARATORS = [',', ';', '\t']
+
+COLUMN_ALIASES = {
+    'x': ['X'],
+    'y': ['Y'],
+    'dx': ['EX', 'DX', 'ΔX', 'DELTAX', 'ERROR_X', 'XERR'],
+    'dy': ['EY', 'DY', 'ΔY', 'DELTAY', 'ERROR_Y', 'YERR'],
+}
+
+class IngestError(ValueError):
+    status_code = 400
+
+class UploadTooLarge(IngestError):
+    status_code = 413
+
+def _demasiado_grande(max_bytes):
+    return UploadTooLarge(f"Archivo demasiado grande (máximo {max_bytes // (1024 * 1024)} MB)")
+
+class _ReceptorMultipart:
+    """python-multipart callbacks writing the ``field`` file part to a temp
+    file as its bytes arrive; other parts are skipped."""
+
+    def __init__(self, field, extensions, max_bytes):
+        self.field = field
+        self.extensions = extensions
+        self.max_bytes = max_bytes
+        self.path = None
+        self.filename = None
+        self.size = 0
+        self._out = None
+        self._header = b""
+        self._value = b""
+        self._disposition = b""
+        self.callbacks = {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+
+    def on_header_field(self, data, start, end):
+        self._header += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        if self._header.lower() == b"content-disposition":
+            self._disposition = self._value
+        self._header = self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name", b"").decode("utf-8", "replace") != self.field or b"filename" not in options:
+            return
+        if self.path is not None:
+            raise IngestError("Envía un solo archivo")
+        filename = options[b"filename"].decode("utf-8", "replace")
+        if not filename.lower().endswith(self.extensions):
+            raise IngestError("Formato no soportado. Usa CSV, TXT, o Excel (.xlsx)")
+        fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+        self._out = os.fdopen(fd, "wb")
+        self.filename = filename
+
+    def on_part_data(self, data, start, end):
+        if self._out is None:
+            return
+        self.size += end - start
+        if self.size > self.max_bytes:
+            raise _demasiado_grande(self.max_bytes)
+        self._out.write(data[start:end])
+
+    def on_part_end(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def descartar(self):
+        if self._out is not None:
+            self._out.close()
+        if self.path is not None:
+            os.remove(self.path)
+
+async def recibir_upload(stream, headers, field="file", extensions=('.csv', '.txt', '.xlsx', '.xls'),
+                         max_bytes=MAX_UPLOAD_BYTES):
+    """Receive a multipart/form-data body (an async iterator of chunks, e.g.
+    ``request.stream()``) into a temp file, enforcing the size limit.
+
+    Returns (temp file path, client filename); the caller removes the file.
+    """
+    length = headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise _demasiado_grande(max_bytes)
+    content_type, options = parse_options_header(headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise IngestError(f"Envía el archivo como multipart/form-data (campo {field})")
+
+    receptor = _ReceptorMultipart(field, extensions, max_bytes)
+    received = 0
+    try:
+        parser = multipart.MultipartParser(options[b"boundary"], receptor.callbacks)
+        async for chunk in stream:
+            received += len(chunk)
+            if received > max_bytes + MULTIPART_OVERHEAD:
+                raise _demasiado_grande(max_bytes)
+            parser.write(chunk)
+        parser.finalize()
+    except multipart.exceptions.FormParserError as e:
+        receptor.descartar()
+        raise IngestError(f"Cuerpo multipart inválido: {e}")
+    except BaseException:
+        receptor.descartar()
+        raise
+    if receptor.path is None:
+        raise IngestError(f"Falta el archivo (campo {field})")
+    receptor.on_part_end()
+    return receptor.path, receptor.filename
+
+def mapear_columnas(columns):
+    """Map x/y/dx/dy to column names: by alias first, then by position."""
+    col_map = {}
+    for col in columns:
+        for key, aliases in COLUMN_ALIASES.items():
+            if col in aliases:
+                col_map[key] = col
+
+    # Fallback: use positional columns if not found by name
+    for i, key in enumerate(['x', 'y', 'dx', 'dy']):
+        if key not in col_map and len(columns) > i:
+            col_map[key] = columns[i]
+
+    if 'x' not in col_map or 'y' not in col_map:
+        raise IngestError("No se encontraron columnas X e Y")
+    return col_map
+
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def sniff_csv(prefix):
+    """Guess (separator, has_header) from the first bytes of a text file."""
+    text = prefix.decode("utf-8-sig", errors="replace")
+    # Drop a possibly truncated last line
+    lines = [l for l in text.splitlines()[:-1] if l.strip()] or [l for l in text.splitlines() if l.strip()]
+    if not lines:
+        raise IngestError("Archivo vacío")
+
+    sep = None
+    try:
+        sep = csv.Sniffer().sniff("\n".join(lines[:50]), delimiters="".join(SEPARATORS)).delimiter
+    except csv.Error:
+        pass
+    if sep is None:
+        # Same preference order as before: first separator giving >= 2 columns
+        sep = next((s for s in SEPARATORS if len(lines[0].split(s)) >= 2), SEPARATORS[0])
+
+    first = [c.strip().strip('"') for c in lines[0].split(sep)]
+    has_header = not all(_is_number(c) for c in first if c)
+    return sep, has_header
+
+def _resultado(columns, n_rows, col_map):
+    x, y = columns['x'], columns['y']
+    return {
+        "x": x,
+        "y": y,
+        "dx": columns['dx'] if 'dx' in col_map else np.zeros(n_rows),
+        "dy": columns['dy'] if 'dy' in col_map else np.zeros(n_rows),
+        "columns_found": list(col_map.keys()),
+        "n_rows": n_rows,
+    }
+
+def leer_csv(path):
+    import pandas as pd
+
+    with open(path, "rb") as f:
+        prefix = f.read(SNIFF_BYTES)
+    sep, has_header = sniff_csv(prefix)
+
+    if has_header:
+        header = pd.read_csv(path, sep=sep, nrows=0, encoding="utf-8-sig").columns
+        names = [str(c).strip().upper() for c in header]
+    else:
+        with open(path, "rb") as f:
+            first_line = f.readline().decode("utf-8-sig", errors="replace")
+        names = [str(i) for i in range(len(first_line.split(sep)))]
+    col_map = mapear_columnas(names)
+
+    wanted = sorted({names.index(c) for c in col_map.values()})
+    df = pd.read_csv(
+        path, sep=sep, encoding="utf-8-sig",
+        header=0 if has_header else None,
+        usecols=wanted,
+        dtype={i: np.float64 for i in wanted},
+        engine="c",
+    )
+    by_name = {names[i]: df.iloc[:, k].to_numpy(dtype=np.float64) for k, i in enumerate(wanted)}
+    columns = {key: by_name[col] for key, col in col_map.items()}
+    return _resultado(columns, len(df), col_map)
+
+def leer_excel(path):
+    """Read-only streaming path for .xlsx; legacy .xls goes through pandas."""
+    if path.lower().endswith(".xls"):
+        import pandas as pd
+        df = pd.read_excel(path)
+        names = [str(c).strip().upper() for c in df.columns]
+        col_map = mapear_columnas(names)
+        columns = {key: df.iloc[:, names.index(col)].to_numpy(dtype=np.float64) for key, col in col_map.items()}
+        return _resultado(columns, len(df), col_map)
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise IngestError("Archivo vacío")
+        names = [str(c).strip().upper() if c is not None else "" for c in header]
+        col_map = mapear_columnas(names)
+        idx = {key: names.index(col) for key, col in col_map.items()}
+
+        buffers = {key: [] for key in idx}
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            for key, i in idx.items():
+                v = row[i] if i < len(row) else None
+                buffers[key].append(np.nan if v is None else v)
+    finally:
+        wb.close()
+
+    columns = {key: np.asarray(vals, dtype=np.float64) for key, vals in buffers.items()}
+    return _resultado(columns, len(columns['x']), col_map)
+
+def leer_tabla(path, filename):
+    filename = filename.lower()
+    if filename.endswith(('.csv', '.txt')):
+        return leer_csv(path)
+    if filename.endswith(('.xlsx', '.xls')):
+        return leer_excel(path)
+    raise IngestError("Formato no soportado. Usa CSV, TXT, o Excel (.xlsx)")
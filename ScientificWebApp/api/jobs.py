@@ -0,0 +1,395 @@
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import formula
+import logic
+import metrics
+import montecarlo
+
+# ========== JOBS ==========
+#
+# Long fits, renders and propagations can run as jobs: the request only
+# validates and enqueues, and the client polls (or streams) the job until its
+# result is ready. The queue is pluggable (JOB_BACKEND); the default keeps
+# everything in this process and runs the jobs on its own process pool.
+#
+# A ProcessPoolExecutor can't stop one task, so a running job that times out
+# or is cancelled takes its pool down with it: the workers are terminated,
+# a fresh pool replaces them and the other jobs that were in the old pool are
+# resubmitted (they are pure computations, so running them again is safe).
+# Finished jobs are kept for JOB_TTL seconds.
+
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "local")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 0))  # 0: one per available core
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", 300))
+JOB_MAX_TIMEOUT = float(os.environ.get("JOB_MAX_TIMEOUT", 3600))
+JOB_TTL = int(os.environ.get("JOB_TTL", 3600))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 1000))
+JOB_MAX_ATTEMPTS = 3  # runs of a job lost to pool restarts before it fails
+WATCH_INTERVAL = 0.2
+
+FINISHED = ("done", "failed", "cancelled", "timeout")
+
+class JobError(ValueError):
+    status_code = 400
+
+class QueueFull(JobError):
+    status_code = 503
+
+class JobNotFound(KeyError):
+    pass
+
+# ----- worker side -----
+
+_events = None
+_worker = threading.local()
+
+def _iniciar_worker(events):
+    global _events
+    _events = events
+
+def _ejecutar(job_id, kind, payload):
+    """Run one job in a pool worker. Top-level so it can be shipped to a process pool."""
+    _worker.job_id = job_id
+    _events.put(("start", job_id, 0.0, None))
+    try:
+        return TASKS[kind](payload)
+    finally:
+        _worker.job_id = None
+
+def informar(progress, stage=None):
+    """Report the progress (0..1) and current stage of the job running in
+    this worker; a no-op outside a job."""
+    job_id = getattr(_worker, "job_id", None)
+    if _events is not None and job_id is not None:
+        _events.put(("progress", job_id, float(progress), stage))
+
+# ----- tasks -----
+# Payloads are validated by the API before they are enqueued.
+
+def tarea_ajuste(p):
+    x, y, dx, dy = (np.asarray(p[c], dtype=float) for c in ("x", "y", "dx", "dy"))
+    xerr = dx if p["use_dx"] else None
+    informar(0.0, "fit")
+    if p["models"]:
+        fits, errors = logic.comparar_modelos(x, y, dy, p["models"], xerr=xerr)
+        if not fits:
+            raise ValueError(f"Ningún modelo pudo ajustarse: {errors}")
+        ranking = logic.ranking_modelos(fits, len(x))
+        model_type = ranking[0]["model"]
+        result = {"model": model_type, "stats": fits[model_type], "ranking": ranking, "errors": errors}
+    else:
+        model_type = p["model"]
+        stats = logic.funcionChi2(x, y, dy, logic.modelo(model_type), model_type=model_type, xerr=xerr)
+        result = {"stats": stats}
+
+    if p["uncertainty"] != "hessian":
+        informar(0.3, "uncertainty")
+        stats = result["stats"]
+        result["stats"] = dict(stats, montecarlo=montecarlo.ajuste_montecarlo(
+            x, y, dx, dy, model_type, stats, p["uncertainty"],
+            samples=p["samples"], confidence=p["confidence"], seed=p["seed"], use_dx=p["use_dx"]))
+
+    render = p["render"]
+    if render != "none":
+        informar(0.8, "render")
+        plot_data = {
+            'x': x, 'y': y, 'dx': dx, 'dy': dy,
+            'params': result["stats"]['params'], 'chi2_ndof': result["stats"]['chi2_ndof'],
+            'title': p["title"], 'xlabel': p["xlabel"], 'ylabel': p["ylabel"],
+        }
+        if render in ("png", "svg"):
+            result["image"] = logic.graf_plot(plot_data, model_type=model_type, fmt=render)
+            result["image_format"] = render
+        else:
+            result["plot"] = logic.datos_ajuste(plot_data, model_type)
+    return result
+
+def tarea_gauss(p):
+    values = np.asarray(p["values"], dtype=float)
+    informar(0.0, "stats")
+    result = logic.fgaus(values)
+    if p["fit"]:
+        informar(0.3, "fit")
+        result = dict(result, fit=logic.ajuste_gauss(values, result))
+    render = p["render"]
+    if render != "none":
+        informar(0.5, "render")
+        if render in ("png", "svg"):
+            result = dict(result, image=logic.gauss_plot(values, result, fmt=render), image_format=render)
+        else:
+            result = dict(result, plot=logic.datos_gauss(values, result))
+    return result
+
+def tarea_propagacion(p):
+    informar(0.0, "linear")
+    result = logic.propagacion_lote(*p["args"])
+    if p["montecarlo"]:
+        informar(0.2, "montecarlo")
+        result["montecarlo"] = montecarlo.propagacion_montecarlo(
+            *p["args"], samples=p["samples"], confidence=p["confidence"], seed=p["seed"])
+    return result
+
+def tarea_formula(p):
+    informar(0.0, "linear")
+    result = formula.evaluar_formula(p["formula"], p["values"], p["uncertainties"])
+    if p["montecarlo"]:
+        informar(0.2, "montecarlo")
+        result["montecarlo"] = montecarlo.formula_montecarlo(
+            p["formula"], p["values"], p["uncertainties"],
+            samples=p["samples"], confidence=p["confidence"], seed=p["seed"])
+    return result
+
+TASKS = {
+    "fit": tarea_ajuste,
+    "gauss": tarea_gauss,
+    "propagation": tarea_propagacion,
+    "formula": tarea_formula,
+}
+
+# ----- queues -----
+
+class Job:
+    __slots__ = ("id", "kind", "payload", "timeout", "status", "progress", "stage", "created", "started",
+                 "started_mono", "finished", "expires", "result", "error", "attempts", "future", "pool")
+
+    def __init__(self, kind, payload, timeout):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.timeout = timeout
+        self.status = "queued"
+        self.progress = 0.0
+        self.stage = None
+        self.created = time.time()
+        self.started = self.started_mono = self.finished = self.expires = None
+        self.result = self.error = None
+        self.attempts = 0
+        self.future = self.pool = None
+
+    def snapshot(self, result=True):
+        snap = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "stage": self.stage,
+            "created_at": self.created,
+            "started_at": self.started,
+            "finished_at": self.finished,
+            "expires_at": self.expires,
+            "timeout": self.timeout,
+        }
+        if self.error is not None:
+            snap["error"] = self.error
+        if result and self.status == "done":
+            snap["result"] = self.result
+        return snap
+
+class JobQueue:
+    """Queue backend interface. ``get`` and ``cancel`` return a snapshot dict
+    (see Job.snapshot) and raise JobNotFound for unknown or expired ids."""
+
+    def submit(self, kind, payload, timeout=JOB_TIMEOUT):
+        """Enqueue a job and return its id."""
+        raise NotImplementedError
+
+    def get(self, job_id, result=True):
+        raise NotImplementedError
+
+    def cancel(self, job_id):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+class LocalJobQueue(JobQueue):
+    """Jobs held in memory and run on a process pool owned by this process
+    (threads where processes can't be spawned; then running jobs can't be
+    killed, and a timed-out or cancelled job's result is just dropped)."""
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL, max_pending=JOB_MAX_PENDING):
+        if workers <= 0:
+            workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        self.workers = workers or 1
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._jobs = {}
+        self._lock = threading.RLock()
+        self._pool = None
+        self._events = None
+        self._processes = True
+        self._watchdog = None
+
+    def _nuevo_pool(self):
+        """Fresh pool with its own event queue: a worker killed while writing
+        to a queue leaves it unusable, so queues are never shared across pools."""
+        if self._processes:
+            try:
+                events = multiprocessing.Queue()
+                pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_iniciar_worker,
+                                           initargs=(events,))
+            except (OSError, NotImplementedError, ImportError):
+                self._processes = False
+        if not self._processes:
+            events = queue.Queue()
+            pool = ThreadPoolExecutor(max_workers=self.workers, initializer=_iniciar_worker, initargs=(events,))
+        self._pool, self._events = pool, events
+        threading.Thread(target=self._escuchar, args=(events,), name="job-events", daemon=True).start()
+
+    def _arrancar(self):
+        if self._pool is None:
+            self._nuevo_pool()
+            self._watchdog = threading.Thread(target=self._vigilar, name="job-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def submit(self, kind, payload, timeout=None):
+        if kind not in TASKS:
+            raise JobError(f"Tipo de trabajo desconocido: {kind} (usa {', '.join(TASKS)})")
+        timeout = JOB_TIMEOUT if timeout is None else float(timeout)
+        if not 0 < timeout <= JOB_MAX_TIMEOUT:
+            raise JobError(f"timeout debe estar en (0, {JOB_MAX_TIMEOUT:g}] segundos")
+        job = Job(kind, payload, timeout)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+            if pending >= self.max_pending:
+                raise QueueFull("Cola de trabajos llena, inténtalo más tarde")
+            self._arrancar()
+            self._jobs[job.id] = job
+            self._enviar(job)
+        return job.id
+
+    def _enviar(self, job):
+        job.attempts += 1
+        job.pool = self._pool
+        job.future = self._pool.submit(_ejecutar, job.id, job.kind, job.payload)
+        job.future.add_done_callback(lambda future, job=job: self._terminado(job, future))
+
+    def _terminar(self, job, status, error=None, result=None):
+        job.status = status
+        job.error = error
+        job.result = result
+        job.finished = time.time()
+        job.expires = job.finished + self.ttl
+        job.payload = job.future = job.pool = None
+        if status == "done":
+            job.progress = 1.0
+        metrics.jobs_total.inc(1, job.kind, status)
+
+    def _terminado(self, job, future):
+        with self._lock:
+            if job.status in FINISHED or future is not job.future:
+                return
+            if future.cancelled():
+                self._terminar(job, "cancelled", "Cancelado")
+                return
+            exc = future.exception()
+            if exc is None:
+                self._terminar(job, "done", result=future.result())
+            elif isinstance(exc, BrokenProcessPool) and job.attempts < JOB_MAX_ATTEMPTS:
+                # Its pool was torn down under it (another job's time limit)
+                job.status, job.progress, job.stage = "queued", 0.0, None
+                job.started = job.started_mono = None
+                self._enviar(job)
+            elif isinstance(exc, BrokenProcessPool):
+                self._terminar(job, "failed", "El proceso de trabajo terminó inesperadamente")
+            else:
+                self._terminar(job, "failed", str(exc))
+
+    def _escuchar(self, events):
+        while True:
+            try:
+                event, job_id, progress, stage = events.get(timeout=1)
+            except queue.Empty:
+                if events is not self._events:
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status in FINISHED:
+                    continue
+                if event == "start" and job.status == "queued":
+                    job.status = "running"
+                    job.started = time.time()
+                    job.started_mono = time.monotonic()
+                elif event == "progress":
+                    job.progress, job.stage = progress, stage
+
+    def _vigilar(self):
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            now, mono = time.time(), time.monotonic()
+            with self._lock:
+                for job_id in [j.id for j in self._jobs.values() if j.expires is not None and j.expires < now]:
+                    del self._jobs[job_id]
+                late = [j for j in self._jobs.values()
+                        if j.status == "running" and mono - j.started_mono > j.timeout]
+                if late:
+                    self._matar(late, "timeout", f"Tiempo límite excedido ({late[0].timeout:g} s)")
+
+    def _matar(self, victims, status, error):
+        """Finish running jobs now; with processes, their pool is replaced and
+        its workers terminated (the other jobs in it get resubmitted)."""
+        pools = {job.pool for job in victims}
+        for job in victims:
+            self._terminar(job, status, error)
+        if not self._processes:
+            return
+        for pool in pools:
+            if pool is self._pool:
+                self._nuevo_pool()
+            for process in list(getattr(pool, "_processes", {}).values()):
+                process.terminate()
+            pool.shutdown(wait=False, cancel_futures=False)
+
+    def get(self, job_id, result=True):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise JobNotFound(job_id)
+            return job.snapshot(result)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise JobNotFound(job_id)
+            if job.status == "running":
+                self._matar([job], "cancelled", "Cancelado")
+            elif job.status == "queued" and not job.future.cancel():
+                # Already handed to a worker's call queue: let it run, drop the result
+                self._terminar(job, "cancelled", "Cancelado")
+            return job.snapshot()
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"backend": "local", "workers": self.workers, "processes": self._processes, "jobs": counts}
+
+BACKENDS = {"local": LocalJobQueue}
+
+_queue = None
+
+def get_queue():
+    """The configured queue: a name in BACKENDS or "package.module:Class"."""
+    global _queue
+    if _queue is None:
+        factory = BACKENDS.get(JOB_BACKEND)
+        if factory is None:
+            module, _, attr = JOB_BACKEND.partition(":")
+            factory = getattr(importlib.import_module(module), attr)
+        _queue = factory()
+    return _queue
@@ -0,0 +1,249 @@
+import numpy as np
+
+import logic
+
+# ========== PROFILE LIKELIHOOD ==========
+#
+# Profiles and contours of the fit chi2 over a grid of parameter values
+# around the best fit, minimizing over the parameters not on the grid:
+#
+# - nothing left free (a 2-parameter model's contour): the chi2 of every grid
+#   point is one vectorized evaluation;
+# - a model linear in its parameters: the free ones are a linear least
+#   squares problem for all grid points at once (one QR, many right-hand
+#   sides);
+# - otherwise Minuit with the grid parameters fixed, warm-started from the
+#   neighbouring grid point; grid rows are independent tasks, so they can be
+#   spread over a worker pool.
+#
+# MINOS-like intervals are read off the 1-D profiles where delta chi2 = 1.
+
+PROFILE_POINTS = 41
+CONTOUR_GRID = 31
+SPAN = 3.0                     # grid half-width, in Hessian sigmas
+GRID_CHUNK_ELEMENTS = 2_000_000
+DELTA_CHI2_1D = 1.0
+# delta chi2 of the 68.27% / 95.45% regions for two parameters
+CONTOUR_LEVELS = (2.30, 6.18)
+
+class ProfileError(ValueError):
+    pass
+
+def _pesos(yerr):
+    return 1.0 / np.where(yerr == 0, 1e-10, yerr)
+
+def _chi2_rejilla(mod, x, y, yerr, P):
+    """chi2 at each row of P (G, k), in chunks of GRID_CHUNK_ELEMENTS."""
+    inv = _pesos(yerr)
+    chunk = max(1, GRID_CHUNK_ELEMENTS // max(len(x), 1))
+    out = np.empty(len(P))
+    with np.errstate(all="ignore"):
+        for start in range(0, len(P), chunk):
+            block = P[start:start + chunk]
+            f = mod.func(x[None, :], *(block[:, j, None] for j in range(block.shape[1])))
+            r = (y - f) * inv
+            out[start:start + chunk] = np.einsum("gn,gn->g", r, r)
+    return np.where(np.isfinite(out), out, np.inf)
+
+def _perfil_lineal(mod, x, y, yerr, fixed, values):
+    """Profile of a linear-in-parameters model: with ``fixed`` columns set to
+    each row of ``values`` (G, m), the rest is solved for all rows at once."""
+    inv = _pesos(yerr)
+    A = mod.design(x) * inv[:, None]
+    b = y * inv
+    k = A.shape[1]
+    free = [j for j in range(k) if j not in fixed]
+    P = np.empty((len(values), k))
+    P[:, fixed] = values
+    chi2 = np.empty(len(values))
+    chunk = max(1, GRID_CHUNK_ELEMENTS // max(len(x), 1))
+    Q = R = None
+    if free:
+        Q, R = np.linalg.qr(A[:, free])
+    for start in range(0, len(values), chunk):
+        rows = slice(start, start + chunk)
+        rhs = b[:, None] - A[:, fixed] @ values[rows].T
+        if free:
+            theta = np.linalg.solve(R, Q.T @ rhs)
+            rhs = rhs - A[:, free] @ theta
+            P[rows, free] = theta.T
+        chi2[rows] = np.einsum("ng,ng->g", rhs, rhs)
+    return chi2, P
+
+def perfil_minuit(x, y, yerr, model_type, fixed, values, start, steps):
+    """Minuit profile along the rows of ``values`` (G, m) for the parameter
+    indices in ``fixed``, each minimization starting from the previous one.
+
+    Top-level so grid rows can be shipped to a process pool.
+    """
+    from iminuit import Minuit, cost
+
+    mod = logic.MODELOS[model_type]
+    yerr_safe = np.where(yerr == 0, 1e-10, yerr)
+    least_squares = cost.LeastSquares(x, y, yerr_safe, mod.func, grad=mod.grad, name=mod.params)
+    m = Minuit(least_squares, **start)
+    for name, step in steps.items():
+        if step > 0 and np.isfinite(step):
+            m.errors[name] = step
+    m.strategy = 0
+    for j in fixed:
+        m.fixed[mod.params[j]] = True
+
+    chi2 = np.empty(len(values))
+    P = np.empty((len(values), len(mod.params)))
+    for g, row in enumerate(values):
+        for j, v in zip(fixed, row):
+            m.values[mod.params[j]] = v
+        m.migrad()
+        P[g] = m.values
+        chi2[g] = m.fval
+    return np.where(np.isfinite(chi2), chi2, np.inf), P
+
+def _evaluar(mod, model_type, x, y, yerr, fixed, tasks, start, steps, executor):
+    """chi2 and parameters for each task (an array of grid rows walked in order)."""
+    if len(fixed) == len(mod.params):
+        return [(_chi2_rejilla(mod, x, y, yerr, t), t) for t in tasks]
+    if mod.design is not None:
+        return [_perfil_lineal(mod, x, y, yerr, fixed, t) for t in tasks]
+    if executor is None:
+        return [perfil_minuit(x, y, yerr, model_type, fixed, t, start, steps) for t in tasks]
+    futures = [executor.submit(perfil_minuit, x, y, yerr, model_type, fixed, t, start, steps) for t in tasks]
+    return [f.result() for f in futures]
+
+def _cruce(values, dchi2, level):
+    """Where the profile first crosses ``level`` on each side of its minimum
+    (linear interpolation); None when it stays below within the scan."""
+    def interp(i, j):
+        t = (level - dchi2[i]) / (dchi2[j] - dchi2[i])
+        return float(values[i] + t * (values[j] - values[i]))
+
+    i0 = int(np.argmin(dchi2))
+    lower = next((interp(i, i - 1) for i in range(i0, 0, -1) if dchi2[i] < level <= dchi2[i - 1]), None)
+    upper = next((interp(i, i + 1) for i in range(i0, len(values) - 1) if dchi2[i] < level <= dchi2[i + 1]), None)
+    return lower, upper
+
+def _rejilla(stats, name, span, points):
+    value = stats['params'][name]['value']
+    error = stats['params'][name]['error']
+    if not (error > 0 and np.isfinite(error)):
+        error = max(abs(value) * 0.1, 1e-3)
+    return np.linspace(value - span * error, value + span * error, points)
+
+def perfiles(x, y, yerr, model_type, stats, params=None, contours=(), points=PROFILE_POINTS,
+             grid=CONTOUR_GRID, span=SPAN, executor=None):
+    """1-D profiles (with MINOS-like intervals) for ``params`` and 2-D delta
+    chi2 maps for each pair in ``contours``, around the fit ``stats``."""
+    mod = logic.MODELOS[model_type]
+    x, y, yerr = (np.asarray(c, dtype=float) for c in (x, y, yerr))
+    names = list(params) if params is not None else list(mod.params)
+    for name in names + [n for pair in contours for n in pair]:
+        if name not in mod.params:
+            raise ProfileError(f"Parámetro desconocido para {model_type}: {name}")
+    if not names and not contours:
+        raise ProfileError("Pide al menos un perfil (params) o un contorno")
+    if any(len(pair) != 2 or pair[0] == pair[1] for pair in contours):
+        raise ProfileError("Cada contorno necesita dos parámetros distintos")
+    if not (3 <= points <= 401 and 3 <= grid <= 201 and 0 < span <= 20):
+        raise ProfileError("points en [3, 401], grid en [3, 201] y span en (0, 20]")
+
+    start = {p: stats['params'][p]['value'] for p in mod.params}
+    steps = {p: stats['params'][p]['error'] for p in mod.params}
+    chi2_min = stats['chi2']
+
+    profiles = {}
+    for name in names:
+        j = mod.params.index(name)
+        values = _rejilla(stats, name, span, points)
+        center = int(np.argmin(np.abs(values - start[name])))
+        # Walk outwards from the best fit so each point warm-starts the next
+        down, up = values[center::-1, None], values[center:, None]
+        (c_down, _), (c_up, _) = _evaluar(mod, model_type, x, y, yerr, [j], [down, up],
+                                          start, steps, executor)
+        chi2 = np.concatenate((c_down[::-1], c_up[1:]))
+        profiles[name] = (values, chi2)
+        chi2_min = min(chi2_min, float(np.min(chi2)))
+
+    maps = []
+    for a_name, b_name in contours:
+        ja, jb = mod.params.index(a_name), mod.params.index(b_name)
+        va, vb = _rejilla(stats, a_name, span, grid), _rejilla(stats, b_name, span, grid)
+        # One task per row of the grid, each walked from the middle outwards
+        mid = grid // 2
+        order = np.r_[mid:grid, mid - 1:-1:-1] if mid else np.arange(grid)
+        tasks = [np.column_stack((np.full(grid, a), vb[order])) for a in va]
+        rows = _evaluar(mod, model_type, x, y, yerr, [ja, jb], tasks, start, steps, executor)
+        chi2 = np.empty((grid, grid))
+        for i, (c, _) in enumerate(rows):
+            chi2[i, order] = c
+        maps.append((a_name, b_name, va, vb, chi2))
+        chi2_min = min(chi2_min, float(np.min(chi2)))
+
+    def clean(arr):
+        return np.where(np.isfinite(arr), arr, -1.0).tolist()
+
+    result = {"model_type": model_type, "chi2_min": logic.safe_float(chi2_min), "profiles": {}, "contours": []}
+    for name, (values, chi2) in profiles.items():
+        dchi2 = chi2 - chi2_min
+        lower, upper = _cruce(values, dchi2, DELTA_CHI2_1D)
+        best = start[name]
+        result["profiles"][name] = {
+            "values": values.tolist(),
+            "dchi2": clean(dchi2),
+            "lower": lower,
+            "upper": upper,
+            "error_lower": None if lower is None else logic.safe_float(best - lower),
+            "error_upper": None if upper is None else logic.safe_float(upper - best),
+            "hessian_error": stats['params'][name]['error'],
+        }
+    for a_name, b_name, va, vb, chi2 in maps:
+        result["contours"].append({
+            "params": [a_name, b_name],
+            "x": va.tolist(),
+            "y": vb.tolist(),
+            "dchi2": clean((chi2 - chi2_min).T),  # rows follow y, columns x
+            "levels": list(CONTOUR_LEVELS),
+        })
+    return result
+
+def perfil_plot(result, fmt="png", dpi=logic.PLOT_DPI, size=None, raw=False):
+    """Profiles and contours as one figure, one panel each."""
+    from matplotlib.figure import Figure
+
+    panels = len(result["profiles"]) + len(result["contours"])
+    if panels == 0:
+        raise ProfileError("Nada que dibujar")
+    ncols = min(3, panels)
+    nrows = -(-panels // ncols)
+    fig = Figure(figsize=size or (4.5 * ncols, 3.8 * nrows))
+    axes = fig.subplots(nrows, ncols, squeeze=False).ravel()
+
+    i = 0
+    for name, prof in result["profiles"].items():
+        ax = axes[i]
+        dchi2 = np.array(prof["dchi2"], dtype=float)
+        values = np.array(prof["values"])
+        ok = dchi2 >= 0
+        ax.plot(values[ok], dchi2[ok], '-', color='#6c63ff', linewidth=2)
+        ax.axhline(DELTA_CHI2_1D, color='0.5', linestyle='--', linewidth=1)
+        for bound in (prof["lower"], prof["upper"]):
+            if bound is not None:
+                ax.axvline(bound, color='#e4572e', linestyle=':', linewidth=1)
+        ax.set_xlabel(name, fontsize=12)
+        ax.set_ylabel(r"$\Delta\chi^2$", fontsize=12)
+        ax.grid(True, linestyle='--', linewidth=0.4, alpha=0.7)
+        i += 1
+    for cont in result["contours"]:
+        ax = axes[i]
+        dchi2 = np.array(cont["dchi2"], dtype=float)
+        dchi2 = np.where(dchi2 >= 0, dchi2, np.nan)
+        ax.contourf(cont["x"], cont["y"], dchi2, levels=[0, *cont["levels"]], colors=['#6c63ff', '#b8b4ff'], alpha=0.8)
+        ax.contour(cont["x"], cont["y"], dchi2, levels=cont["levels"], colors='k', linewidths=1)
+        ax.set_xlabel(cont["params"][0], fontsize=12)
+        ax.set_ylabel(cont["params"][1], fontsize=12)
+        ax.grid(True, linestyle='--', linewidth=0.4, alpha=0.7)
+        i += 1
+    for ax in axes[i:]:
+        ax.set_visible(False)
+    fig.suptitle(f"Perfiles de verosimilitud ({result['model_type']})", fontsize=14, fontweight='bold')
+    fig.tight_layout()
+    return logic.exportar_figura(fig, fmt, dpi, raw)
@@ -1,13 +1,16 @@
 import numpy as np
-import statistics as stat_module
 import math
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from iminuit import Minuit, cost
-from scipy.stats import norm
+import os
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import io
 import base64
+import time
+
+import metrics
+
+# Heavy dependencies (matplotlib, iminuit) are imported inside the functions
+# that need them so a cold start for /api/calculate doesn't pay for them.
 
 # ========== HELPERS ==========
 
@@ -19,6 +22,19 @@ def safe_float(val):
         return float(val)
     return val
 
+def normal_pdf(x, mean, std):
+    """Normal probability density (avoids importing scipy.stats)."""
+    z = (x - mean) / std
+    return np.exp(-0.5 * z * z) / (std * math.sqrt(2 * math.pi))
+
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+def normal_cdf(x, mean, std):
+    """Normal cumulative distribution (elementwise math.erf; meant for bin
+    edges, not samples)."""
+    z = (np.asarray(x, dtype=float) - mean) / (std * math.sqrt(2))
+    return 0.5 * (1 + _erf(z).astype(float))
+
 def safe_dict(d):
     """Recursively sanitize all floats in a dict."""
     result = {}
@@ -44,25 +60,237 @@ def funcion_cuadratica(x, a, b, c):
 def funcion_exponencial(x, a, b):
     return a * np.exp(b * x)
 
+def funcion_potencia(x, a, b):
+    return a * np.power(x, b)
+
+def funcion_gaussiana(x, a, mu, sigma):
+    return a * np.exp(-0.5 * ((x - mu) / sigma) ** 2)
+
+def funcion_oscilacion(x, a, gamma, omega, phi):
+    return a * np.exp(-gamma * x) * np.cos(omega * x + phi)
+
+# Analytic gradients, shape (n_params, N), as cost.LeastSquares expects
+
+def grad_lineal(x, a, b):
+    return np.vstack((x, np.ones_like(x)))
+
+def grad_cuadratica(x, a, b, c):
+    return np.vstack((x ** 2, x, np.ones_like(x)))
+
+def grad_exponencial(x, a, b):
+    e = np.exp(b * x)
+    return np.vstack((e, a * x * e))
+
+def grad_potencia(x, a, b):
+    p = np.power(x, b)
+    return np.vstack((p, a * p * np.log(np.where(x > 0, x, 1.0))))
+
+def grad_gaussiana(x, a, mu, sigma):
+    z = (x - mu) / sigma
+    g = np.exp(-0.5 * z * z)
+    return np.vstack((g, a * g * z / sigma, a * g * z * z / sigma))
+
+def grad_oscilacion(x, a, gamma, omega, phi):
+    env = np.exp(-gamma * x)
+    arg = omega * x + phi
+    c, s = np.cos(arg), np.sin(arg)
+    return np.vstack((env * c, -a * x * env * c, -a * x * env * s, -a * env * s))
+
+# dy/dx of each model, for errors-in-variables fits
+
+def dydx_lineal(x, a, b):
+    return np.full_like(x, a)
+
+def dydx_cuadratica(x, a, b, c):
+    return 2 * a * x + b
+
+def dydx_exponencial(x, a, b):
+    return a * b * np.exp(b * x)
+
+def dydx_potencia(x, a, b):
+    return a * b * np.power(x, b - 1)
+
+def dydx_gaussiana(x, a, mu, sigma):
+    return -funcion_gaussiana(x, a, mu, sigma) * (x - mu) / sigma ** 2
+
+def dydx_oscilacion(x, a, gamma, omega, phi):
+    env = np.exp(-gamma * x)
+    arg = omega * x + phi
+    return -a * env * (gamma * np.cos(arg) + omega * np.sin(arg))
+
 # ========== CHI2 FIT ==========
 
-def funcionChi2(x, y, yerr, funcionx, model_type="linear"):
-    # Ensure yerr has no zeros (causes division by zero in chi2)
-    yerr_safe = np.where(yerr == 0, 1e-10, yerr)
+def minimos_cuadrados_ponderados(A, y, yerr):
+    """Weighted linear least squares via QR.
+
+    Returns (values, covariance, chi2). The covariance is the inverse of the
+    chi2 Hessian / 2, i.e. exactly what Minuit's HESSE reports for a chi2 cost.
+    """
+    Aw = A / yerr[:, None]
+    bw = y / yerr
+    Q, R = np.linalg.qr(Aw)
+    if np.any(np.abs(np.diag(R)) <= 1e-12 * np.abs(R).max()):
+        raise np.linalg.LinAlgError("Matriz de diseño singular")
+    values = np.linalg.solve(R, Q.T @ bw)
+    R_inv = np.linalg.inv(R)
+    cov = R_inv @ R_inv.T
+    chi2_val = float(np.sum((bw - Aw @ values) ** 2))
+    return values, cov, chi2_val
 
-    least_squares = cost.LeastSquares(x, y, yerr_safe, funcionx)
+def _recta_log(u, y, yerr, fallback):
+    """Weighted fit of ln|y| = ln|a| + b*u (the sign of y taken from the
+    majority); returns (a, b) or ``fallback``."""
+    sign = 1.0 if np.sum(y > 0) >= np.sum(y < 0) else -1.0
+    mask = (sign * y > 0) & np.isfinite(u)
+    if np.count_nonzero(mask) < 2 or np.ptp(u[mask]) == 0:
+        return fallback
+    ly = np.log(sign * y[mask])
+    # sigma(ln y) = sigma(y) / |y|
+    lerr = yerr[mask] / np.abs(y[mask])
+    try:
+        (b, ln_a), _, _ = minimos_cuadrados_ponderados(
+            np.column_stack((u[mask], np.ones(np.count_nonzero(mask)))), ly, lerr)
+    except np.linalg.LinAlgError:
+        return fallback
+    if not (np.isfinite(b) and np.isfinite(ln_a)) or abs(ln_a) > 700:
+        return fallback
+    return sign * np.exp(ln_a), b
 
-    if model_type == "quadratic":
-        m = Minuit(least_squares, a=0.01, b=1, c=0)
-    elif model_type == "exponential":
-        m = Minuit(least_squares, a=1, b=0.01)
-    else:
-        m = Minuit(least_squares, a=1, b=0)
+def _inicio_exponencial(x, y, yerr):
+    """Log-linear warm start for a * exp(b * x)."""
+    a, b = _recta_log(x, y, yerr, (1, 0.01))
+    return {"a": a, "b": b}
 
-    m.migrad()
+def _inicio_potencia(x, y, yerr):
+    """Log-log warm start for a * x**b (uses the points with x > 0)."""
+    with np.errstate(all="ignore"):
+        u = np.where(x > 0, np.log(np.where(x > 0, x, 1.0)), np.nan)
+    a, b = _recta_log(u, y, yerr, (1, 1))
+    return {"a": a, "b": b}
 
-    chi2_val = float(least_squares(*m.values))
-    ndof = len(x) - len(m.values)
+def _inicio_gaussiana(x, y, yerr):
+    """Peak height and the weighted first/second moments of y >= 0."""
+    w = np.clip(y, 0, None)
+    if w.sum() <= 0:
+        return {"a": float(np.max(np.abs(y))) or 1.0, "mu": float(np.mean(x)), "sigma": float(np.ptp(x)) / 4 or 1.0}
+    mu = float(np.sum(w * x) / w.sum())
+    sigma = float(np.sqrt(np.sum(w * (x - mu) ** 2) / w.sum())) or float(np.ptp(x)) / 4 or 1.0
+    return {"a": float(np.max(y)), "mu": mu, "sigma": sigma}
+
+OSC_START_POINTS = 2000
+OSC_START_FREQS = 800
+
+def _inicio_oscilacion(x, y, yerr):
+    """Frequency from the peak of a periodogram (on at most OSC_START_POINTS
+    points), amplitude/phase from a linear fit of c1*cos(wx) + c2*sin(wx)."""
+    step = max(1, len(x) // OSC_START_POINTS)
+    xs, ys = x[::step], y[::step] - np.mean(y[::step])
+    span = float(np.ptp(xs)) or 1.0
+    # From half a cycle over the range up to ~Nyquist for the sample size
+    cycles = np.linspace(0.5, max(len(xs) / 2, 1.0), OSC_START_FREQS)
+    omegas = 2 * np.pi * cycles / span
+    power = np.abs(np.exp(-1j * np.outer(omegas, xs)) @ ys)
+    omega = float(omegas[np.argmax(power)])
+    try:
+        (c1, c2), _, _ = minimos_cuadrados_ponderados(
+            np.column_stack((np.cos(omega * x), np.sin(omega * x))), y, yerr)
+        a, phi = float(np.hypot(c1, c2)), float(np.arctan2(-c2, c1))
+    except np.linalg.LinAlgError:
+        a, phi = float(np.max(np.abs(y))) or 1.0, 0.0
+    return {"a": a, "gamma": 0.0, "omega": omega, "phi": phi}
+
+# ========== MODEL REGISTRY ==========
+
+class Modelo:
+    """A fit model: vectorized function, analytic gradient, parameter names,
+    start values and the legend label.
+
+    ``start`` is a dict or a callable (x, y, yerr) -> dict. ``label`` is a
+    format string over the parameter names. ``design`` marks models that are
+    linear in their parameters: it maps x to the design matrix and the fit is
+    solved in closed form instead of with Minuit. ``dydx`` is the slope in x,
+    used to fold x errors into the weights; without it a central difference
+    is taken.
+    """
+
+    def __init__(self, name, func, grad, params, start, label, design=None, description="", dydx=None):
+        self.name = name
+        self.func = func
+        self.grad = grad
+        self.params = tuple(params)
+        self.start = start
+        self.label = label
+        self.design = design
+        self.description = description
+        self.dydx = dydx
+
+    def valores_iniciales(self, x, y, yerr):
+        start = self.start(x, y, yerr) if callable(self.start) else self.start
+        return {p: float(start[p]) for p in self.params}
+
+    def pendiente(self, x, values):
+        if self.dydx is not None:
+            return self.dydx(x, *values)
+        h = 1e-6 * np.maximum(np.abs(x), 1.0)
+        return (self.func(x + h, *values) - self.func(x - h, *values)) / (2 * h)
+
+    def etiqueta(self, values):
+        return self.label.format(**dict(zip(self.params, values)))
+
+    def info(self):
+        return {"name": self.name, "params": list(self.params),
+                "linear": self.design is not None, "description": self.description}
+
+MODELOS = {}
+
+def registrar_modelo(mod):
+    MODELOS[mod.name] = mod
+    return mod
+
+registrar_modelo(Modelo(
+    "linear", funcion_lineal, grad_lineal, ("a", "b"), {"a": 1, "b": 0},
+    "y = {a:.3e}x + {b:.3e}",
+    design=lambda x: np.column_stack((x, np.ones_like(x))),
+    description="Lineal (ax + b)", dydx=dydx_lineal))
+registrar_modelo(Modelo(
+    "quadratic", funcion_cuadratica, grad_cuadratica, ("a", "b", "c"), {"a": 0.01, "b": 1, "c": 0},
+    "y = {a:.3e}x² + {b:.3e}x + {c:.3e}",
+    design=lambda x: np.column_stack((x ** 2, x, np.ones_like(x))),
+    description="Cuadrático (ax² + bx + c)", dydx=dydx_cuadratica))
+registrar_modelo(Modelo(
+    "exponential", funcion_exponencial, grad_exponencial, ("a", "b"), _inicio_exponencial,
+    "y = {a:.3e}·e^({b:.3e}x)",
+    description="Exponencial (a·eᵇˣ)", dydx=dydx_exponencial))
+registrar_modelo(Modelo(
+    "power", funcion_potencia, grad_potencia, ("a", "b"), _inicio_potencia,
+    "y = {a:.3e}·x^{b:.3e}",
+    description="Potencia (a·xᵇ)", dydx=dydx_potencia))
+registrar_modelo(Modelo(
+    "gaussian", funcion_gaussiana, grad_gaussiana, ("a", "mu", "sigma"), _inicio_gaussiana,
+    "y = {a:.3e}·exp(-(x - {mu:.3e})² / 2·{sigma:.3e}²)",
+    description="Pico gaussiano", dydx=dydx_gaussiana))
+registrar_modelo(Modelo(
+    "damped_oscillation", funcion_oscilacion, grad_oscilacion, ("a", "gamma", "omega", "phi"),
+    _inicio_oscilacion,
+    "y = {a:.3e}·e^(-{gamma:.3e}x)·cos({omega:.3e}x + {phi:.3f})",
+    description="Oscilación amortiguada", dydx=dydx_oscilacion))
+
+def obtener_modelo(model_type, funcionx=None):
+    """Registered model by name; else the one wrapping ``funcionx``; else linear."""
+    mod = MODELOS.get(model_type)
+    if mod is not None and (funcionx is None or mod.func is funcionx):
+        return mod
+    if funcionx is not None:
+        for mod in MODELOS.values():
+            if mod.func is funcionx:
+                return mod
+    return MODELOS["linear"]
+
+def modelo(model_type):
+    """Model function for a model name; unknown names fall back to linear."""
+    return obtener_modelo(model_type).func
+
+def _resultado_ajuste(values, errors, chi2_val, ndof, model_type, names):
     chi2_ndof = float(chi2_val / ndof) if ndof > 0 else 0
 
     result = {
@@ -70,90 +298,616 @@ def funcionChi2(x, y, yerr, funcionx, model_type="linear"):
         "ndof": ndof,
         "chi2_ndof": safe_float(chi2_ndof),
         "model_type": model_type,
+        "params": {
+            name: {"value": safe_float(values[i]), "error": safe_float(errors[i])}
+            for i, name in enumerate(names)
+        },
     }
 
-    if model_type == "quadratic":
-        result["params"] = {
-            "a": {"value": safe_float(m.values[0]), "error": safe_float(m.errors[0])},
-            "b": {"value": safe_float(m.values[1]), "error": safe_float(m.errors[1])},
-            "c": {"value": safe_float(m.values[2]), "error": safe_float(m.errors[2])},
-        }
-    else:
-        result["params"] = {
-            "a": {"value": safe_float(m.values[0]), "error": safe_float(m.errors[0])},
-            "b": {"value": safe_float(m.values[1]), "error": safe_float(m.errors[1])},
-        }
-
     # Keep backward compat
-    result["p0"] = safe_float(m.values[0])
-    result["p1"] = safe_float(m.values[1])
-    result["p0_error"] = safe_float(m.errors[0])
-    result["p1_error"] = safe_float(m.errors[1])
+    result["p0"] = safe_float(values[0])
+    result["p1"] = safe_float(values[1])
+    result["p0_error"] = safe_float(errors[0])
+    result["p1_error"] = safe_float(errors[1])
 
     return safe_dict(result)
 
+EIV_MAX_ITER = 8   # effective-variance reweighting passes
+EIV_TOL = 1e-3     # stop when no parameter moves by more than this many sigma
+
+def dy_efectiva(x, xerr, yerr, mod, values):
+    """Effective-variance errors sqrt(dy^2 + (f'(x) dx)^2) at parameter
+    ``values``: the weights of an errors-in-variables fit."""
+    with np.errstate(all="ignore"):
+        slope = mod.pendiente(x, values)
+    slope = np.where(np.isfinite(slope), slope, 0.0)
+    return np.sqrt(yerr * yerr + (slope * xerr) ** 2)
+
+def _varianza_efectiva(x, y, xerr, yerr, mod, model_type, inicio, pasos):
+    """Errors-in-variables fit by iterated effective variance:
+    sigma_i^2 = dy_i^2 + (f'(x_i) dx_i)^2 with f' at the current parameters.
+    Each pass is one vectorized reweighting plus a refit warm-started from
+    the previous solution."""
+    stats = funcionChi2(x, y, yerr, mod.func, model_type, inicio=inicio, pasos=pasos)
+    converged = False
+    iterations = 0
+    for iterations in range(1, EIV_MAX_ITER + 1):
+        values = np.array([stats['params'][p]['value'] for p in mod.params])
+        errors = np.array([stats['params'][p]['error'] for p in mod.params])
+        yerr_eff = dy_efectiva(x, xerr, yerr, mod, values)
+        stats = funcionChi2(x, y, yerr_eff, mod.func, model_type,
+                            inicio=dict(zip(mod.params, values)), pasos=dict(zip(mod.params, errors)))
+        new = np.array([stats['params'][p]['value'] for p in mod.params])
+        if np.all(np.abs(new - values) <= EIV_TOL * np.maximum(errors, 1e-300)):
+            converged = True
+            break
+    stats.update(method="effective_variance", iterations=iterations, converged=converged)
+    return stats
+
+def funcionChi2(x, y, yerr, funcionx, model_type="linear", inicio=None, pasos=None, xerr=None):
+    """Chi2 fit of ``funcionx`` to (x, y ± yerr).
+
+    ``inicio``/``pasos`` optionally warm-start Minuit from a previous optimum
+    (its values and errors, as parameter -> float dicts). With ``xerr`` the
+    x uncertainties are propagated through the model slope (effective
+    variance).
+    """
+    mod = obtener_modelo(model_type, funcionx)
+
+    if xerr is not None and np.any(xerr):
+        return _varianza_efectiva(x, y, np.asarray(xerr, dtype=float), yerr, mod, model_type, inicio, pasos)
+
+    # Ensure yerr has no zeros (causes division by zero in chi2)
+    yerr_safe = np.where(yerr == 0, 1e-10, yerr)
+
+    # Fast path: exact weighted least squares, no iterative minimization
+    if mod.design is not None:
+        try:
+            with metrics.etapa("wls"):
+                values, cov, chi2_val = minimos_cuadrados_ponderados(mod.design(x), y, yerr_safe)
+            errors = np.sqrt(np.diag(cov))
+            if np.all(np.isfinite(values)) and np.all(np.isfinite(errors)):
+                return _resultado_ajuste(values, errors, chi2_val, len(x) - len(values), model_type, mod.params)
+        except np.linalg.LinAlgError:
+            pass
+
+    from iminuit import Minuit, cost
+
+    # With an analytic gradient Migrad needs far fewer function calls;
+    # strategy 0 skips its numerical cross-check and HESSE gives the errors.
+    least_squares = cost.LeastSquares(x, y, yerr_safe, mod.func, grad=mod.grad, name=mod.params)
+    m = Minuit(least_squares, **(inicio or mod.valores_iniciales(x, y, yerr_safe)))
+    if pasos:
+        for name, step in pasos.items():
+            if step > 0 and np.isfinite(step):
+                m.errors[name] = step
+    m.strategy = 0
+    with metrics.etapa("migrad"):
+        m.migrad()
+    with metrics.etapa("hesse"):
+        m.hesse()
+    metrics.minuit(mod.name, m.nfcn)
+
+    chi2_val = float(least_squares(*m.values))
+    ndof = len(x) - len(m.values)
+    return _resultado_ajuste(m.values, m.errors, chi2_val, ndof, model_type, mod.params)
+
+def ajustar_dataset(data, model_type="linear", render="none", use_dx=False):
+    """Fit one dataset given as a FitRequest-like dict; ``render`` is one of
+    RENDER_MODES and ``use_dx`` enables the errors-in-variables fit.
+
+    Top-level so it can be shipped to a process pool.
+    """
+    if not (len(data['x']) == len(data['y']) == len(data['dx']) == len(data['dy'])):
+        raise ValueError("Las listas deben tener la misma longitud")
+    if len(data['x']) < 2:
+        raise ValueError("Se necesitan al menos 2 puntos")
+
+    stats = funcionChi2(
+        np.array(data['x'], dtype=float),
+        np.array(data['y'], dtype=float),
+        np.array(data['dy'], dtype=float),
+        modelo(model_type),
+        model_type=model_type,
+        xerr=np.array(data['dx'], dtype=float) if use_dx else None,
+    )
+    result = {"stats": stats}
+    plot_data = dict(data, params=stats['params'], chi2_ndof=stats['chi2_ndof'])
+    if render in ("png", "svg"):
+        result["image"] = graf_plot(plot_data, model_type=model_type, fmt=render)
+        result["image_format"] = render
+    elif render == "data":
+        result["plot"] = datos_ajuste(plot_data, model_type)
+    return result
+
+# ========== MODEL COMPARISON ==========
+
+COMPARE_CRITERIA = ("aic", "bic", "chi2_ndof")
+
+def ajustar_modelo(x, y, yerr, model_type, xerr=None):
+    """funcionChi2 for a registered model name, rejecting fits that can't be
+    ranked (too few points, or a model undefined on the data, e.g. a power
+    law with x <= 0). Top-level so it can be shipped to a process pool."""
+    mod = MODELOS[model_type]
+    if len(x) <= len(mod.params):
+        raise ValueError(f"Se necesitan más de {len(mod.params)} puntos")
+    stats = funcionChi2(x, y, yerr, mod.func, model_type=model_type, xerr=xerr)
+    # safe_dict maps nan to 0, which would rank first; check the raw chi2
+    values = [stats['params'][p]['value'] for p in mod.params]
+    with np.errstate(all="ignore"):
+        resid = (y - mod.func(x, *values)) / np.where(yerr == 0, 1e-10, yerr)
+    if not np.all(np.isfinite(resid)):
+        raise ValueError("El modelo no está definido para estos datos")
+    return stats
+
+def ranking_modelos(fits, n):
+    """Rank fitted models by AIC, also reporting BIC and chi2/ndof.
+
+    ``fits`` maps model name -> funcionChi2 stats. With Gaussian errors
+    -2 ln L = chi2 + const, so AIC = chi2 + 2k and BIC = chi2 + k ln n.
+    Each entry carries its rank under every criterion, delta AIC to the best
+    model and its Akaike weight.
+    """
+    entries = []
+    for name, stats in fits.items():
+        k = len(stats['params'])
+        entries.append({
+            "model": name,
+            "k": k,
+            "chi2": stats['chi2'],
+            "ndof": stats['ndof'],
+            "chi2_ndof": stats['chi2_ndof'],
+            "aic": stats['chi2'] + 2 * k,
+            "bic": stats['chi2'] + k * math.log(n),
+            "params": stats['params'],
+        })
+    for criterion in COMPARE_CRITERIA:
+        # chi2/ndof is best closest to 1, the information criteria lowest
+        key = (lambda e: abs(e[criterion] - 1)) if criterion == "chi2_ndof" else (lambda e: e[criterion])
+        for rank, e in enumerate(sorted(entries, key=key), 1):
+            e.setdefault("ranks", {})[criterion] = rank
+    entries.sort(key=lambda e: e["aic"])
+    if entries:
+        best = entries[0]["aic"]
+        rel = np.exp(-0.5 * np.array([e["aic"] - best for e in entries]))
+        for e, w in zip(entries, rel / rel.sum()):
+            e["delta_aic"] = e["aic"] - best
+            e["weight"] = float(w)
+    return [safe_dict(e) for e in entries]
+
+def comparar_modelos(x, y, yerr, names, executor=None, xerr=None):
+    """Fit every model in ``names`` (concurrently when an executor is given).
+
+    Returns (fits, errors): stats by model name, and the message for each
+    model that could not be fitted.
+    """
+    if executor is None:
+        futures = None
+    else:
+        futures = {name: executor.submit(ajustar_modelo, x, y, yerr, name, xerr) for name in names}
+    fits, errors = {}, {}
+    for name in names:
+        try:
+            fits[name] = futures[name].result() if futures else ajustar_modelo(x, y, yerr, name, xerr)
+        except Exception as e:
+            errors[name] = str(e)
+    return fits, errors
+
+# ========== FIT SESSIONS ==========
+#
+# A session keeps a dataset and its last fit so point-level edits refit
+# cheaply. Models linear in their parameters keep the weighted normal
+# equations (A^T W A, A^T W y, y^T W y) and fold each added/removed point in
+# as a rank-one update, so a refit is a k x k solve. Other models restart
+# Migrad from the previous optimum, with the previous errors as step sizes.
+
+SESSION_REBUILD_EVERY = 1000  # rank-one updates before re-summing (limits drift)
+SESSION_MAX_COND = 1e12       # equilibrated normal matrix; beyond it refit with QR
+
+def _pesos(dy):
+    return 1.0 / np.where(dy == 0, 1e-10, dy) ** 2
+
+class SesionAjuste:
+    def __init__(self, x, y, dx, dy, model_type="linear"):
+        self.mod = obtener_modelo(model_type)
+        self.model_type = self.mod.name
+        self.x = np.array(x, dtype=float)
+        self.y = np.array(y, dtype=float)
+        self.dx = np.array(dx, dtype=float)
+        self.dy = np.array(dy, dtype=float)
+        self.stats = None
+        self.refits = 0
+        if self.mod.design is not None:
+            self._reconstruir()
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def nbytes(self):
+        """Memory held by the session's point arrays."""
+        return sum(c.nbytes for c in (self.x, self.y, self.dx, self.dy))
+
+    # ----- normal equations -----
+
+    def _reconstruir(self):
+        A = self.mod.design(self.x)
+        w = _pesos(self.dy)
+        self._M = (A * w[:, None]).T @ A
+        self._v = A.T @ (w * self.y)
+        self._s = float(w @ (self.y * self.y))
+        self._updates = 0
+
+    def _rango_uno(self, x, y, dy, sign):
+        if self.mod.design is None or len(x) == 0:
+            return
+        A = self.mod.design(x)
+        w = sign * _pesos(dy)
+        self._M += (A * w[:, None]).T @ A
+        self._v += A.T @ (w * y)
+        self._s += float(w @ (y * y))
+        self._updates += len(x)
+
+    # ----- edits -----
+
+    def agregar(self, x, y, dx, dy):
+        x, y, dx, dy = (np.atleast_1d(np.asarray(c, dtype=float)) for c in (x, y, dx, dy))
+        self._rango_uno(x, y, dy, 1.0)
+        self.x = np.concatenate((self.x, x))
+        self.y = np.concatenate((self.y, y))
+        self.dx = np.concatenate((self.dx, dx))
+        self.dy = np.concatenate((self.dy, dy))
+
+    def _indices(self, indices):
+        idx = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        if np.any((idx < 0) | (idx >= len(self.x))):
+            raise IndexError("Índice de punto fuera de rango")
+        return idx
+
+    def eliminar(self, indices):
+        idx = np.unique(self._indices(indices))
+        self._rango_uno(self.x[idx], self.y[idx], self.dy[idx], -1.0)
+        keep = np.ones(len(self.x), dtype=bool)
+        keep[idx] = False
+        self.x, self.y, self.dx, self.dy = self.x[keep], self.y[keep], self.dx[keep], self.dy[keep]
+
+    def editar(self, indices, x=None, y=None, dx=None, dy=None):
+        """Replace fields of existing points; None leaves a field unchanged."""
+        idx = self._indices(indices)
+        if len(np.unique(idx)) != len(idx):
+            raise ValueError("Índices repetidos en la edición")
+        self._rango_uno(self.x[idx], self.y[idx], self.dy[idx], -1.0)
+        for column, new in (("x", x), ("y", y), ("dx", dx), ("dy", dy)):
+            if new is not None:
+                getattr(self, column)[idx] = new
+        self._rango_uno(self.x[idx], self.y[idx], self.dy[idx], 1.0)
+
+    def aplicar(self, update=None, remove=None, add=None):
+        """Apply a set of edits atomically: ``update`` is (indices, columns),
+        ``remove`` a list of indices, ``add`` a dict of new columns. Indices
+        refer to the points before any of the edits; nothing changes if one
+        of them is invalid."""
+        if update is not None:
+            self._indices(update[0])
+        if remove:
+            self._indices(remove)
+        n_after = len(self.x) - (len(np.unique(remove)) if remove else 0) + (len(np.atleast_1d(add['x'])) if add else 0)
+        k = len(self.mod.params)
+        if n_after < 2 or n_after <= k:
+            raise ValueError(f"Se necesitan al menos {max(2, k + 1)} puntos")
+        if update is not None:
+            self.editar(update[0], **update[1])
+        if remove:
+            self.eliminar(remove)
+        if add is not None:
+            self.agregar(**add)
+
+    def _estado(self):
+        state = {c: getattr(self, c).copy() for c in ("x", "y", "dx", "dy")}
+        state["stats"] = self.stats
+        if self.mod.design is not None:
+            state.update(_M=self._M.copy(), _v=self._v.copy(), _s=self._s, _updates=self._updates)
+        return state
+
+    def actualizar(self, update=None, remove=None, add=None):
+        """aplicar() followed by a refit; if either fails the session is
+        left exactly as it was."""
+        state = self._estado()
+        try:
+            self.aplicar(update=update, remove=remove, add=add)
+            return self.ajustar()
+        except ValueError:
+            for name, value in state.items():
+                setattr(self, name, value)
+            raise
+
+    # ----- refit -----
+
+    def _resolver_normales(self):
+        """Params, covariance and chi2 from the normal equations, or None
+        when they are too ill-conditioned to trust."""
+        if self._updates > SESSION_REBUILD_EVERY:
+            self._reconstruir()
+        d = np.sqrt(np.diag(self._M))
+        if not np.all(d > 0):
+            return None
+        # Jacobi equilibration so x**2 vs 1 columns don't inflate the condition number
+        Me = self._M / np.outer(d, d)
+        if not np.isfinite(Me).all() or np.linalg.cond(Me) > SESSION_MAX_COND:
+            return None
+        cov = np.linalg.inv(Me) / np.outer(d, d)
+        values = cov @ self._v
+        chi2_val = self._s - float(values @ self._v)
+        if chi2_val < 1e-6 * self._s:
+            # Cancellation in s - p.v: one exact pass over the residuals
+            resid = (self.y - self.mod.design(self.x) @ values) / np.where(self.dy == 0, 1e-10, self.dy)
+            chi2_val = float(resid @ resid)
+        return values, cov, chi2_val
+
+    def ajustar(self):
+        n, k = len(self.x), len(self.mod.params)
+        if n < 2:
+            raise ValueError("Se necesitan al menos 2 puntos")
+        solved = self._resolver_normales() if self.mod.design is not None else None
+        if solved is not None:
+            values, cov, chi2_val = solved
+            self.stats = _resultado_ajuste(values, np.sqrt(np.diag(cov)), chi2_val, n - k,
+                                           self.model_type, self.mod.params)
+        else:
+            inicio = pasos = None
+            if self.stats is not None:
+                inicio = {p: self.stats['params'][p]['value'] for p in self.mod.params}
+                pasos = {p: self.stats['params'][p]['error'] for p in self.mod.params}
+            self.stats = funcionChi2(self.x, self.y, self.dy, self.mod.func, self.model_type,
+                                     inicio=inicio, pasos=pasos)
+        self.refits += 1
+        return self.stats
+
+    def plot_data(self):
+        return {
+            'x': self.x, 'y': self.y, 'dx': self.dx, 'dy': self.dy,
+            'params': self.stats['params'], 'chi2_ndof': self.stats['chi2_ndof'],
+        }
+
 # ========== PLOT ==========
+#
+# Figures are built with the object-oriented Figure/Agg API and never touch
+# pyplot's global state, so several can be rendered at once from different
+# threads. Rendering runs on a bounded pool (RENDER_WORKERS) via renderizar().
+
+PLOT_DPI = 120
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+
+_render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+def renderizar(plot_func, *args, **kwargs):
+    """Run a plot function on the render pool and wait for its result.
+
+    Runs in a copy of the caller's context so the stage timings of the
+    request (time queued for a render thread, plotting) are kept."""
+    queued = time.perf_counter()
+
+    def run():
+        metrics.registrar("render_queue", time.perf_counter() - queued)
+        with metrics.etapa("plot"):
+            return plot_func(*args, **kwargs)
+    return _render_pool.submit(contextvars.copy_context().run, run).result()
+
+RENDER_MODES = ("png", "svg", "data", "none")
+
+IMAGE_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+}
+
+def exportar_figura(fig, fmt="png", dpi=PLOT_DPI, raw=False):
+    """PNG as a base64 string, SVG as markup text; ``raw`` returns the bytes."""
+    buf = io.BytesIO()
+    with metrics.etapa("savefig"):
+        fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight')
+    if raw:
+        return buf.getvalue()
+    if fmt == "svg":
+        return buf.getvalue().decode('utf-8')
+    with metrics.etapa("base64"):
+        return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+def curva_ajuste(x, params, model_type="linear", points=200):
+    """Fitted curve on a grid spanning the data plus a 10% margin.
+
+    Returns (x_fit, y_fit, label).
+    """
+    x_min, x_max = float(np.min(x)), float(np.max(x))
+    margin = 0.1 * (x_max - x_min) if x_max != x_min else 1
+    x_fit = np.linspace(x_min - margin, x_max + margin, points)
+
+    mod = obtener_modelo(model_type)
+    values = [params[p]['value'] for p in mod.params]
+    y_fit = mod.func(x_fit, *values)
+    label = mod.etiqueta(values)
+    return x_fit, y_fit, label
+
+def chi2_texto(chi2_ndof):
+    return r"$\chi^2 / \nu = {:.4f}$".format(chi2_ndof)
+
+OVERLAY_COLORS = ('#e4572e', '#17bebb', '#ffc914', '#76b041', '#9c6ade', '#8c8c8c')
+
+def _curva_json(x, params, model_type):
+    x_fit, y_fit, label = curva_ajuste(x, params, model_type)
+    return {
+        "x_fit": np.where(np.isfinite(x_fit), x_fit, 0.0).tolist(),
+        "y_fit": np.where(np.isfinite(y_fit), y_fit, 0.0).tolist(),
+        "label": label,
+    }
+
+def datos_ajuste(data, model_type="linear"):
+    """What graf_plot draws, as data for a client-side chart."""
+    result = _curva_json(data['x'], data['params'], model_type)
+    result["chi2_ndof"] = data.get('chi2_ndof', 0)
+    result["chi2_text"] = chi2_texto(data.get('chi2_ndof', 0))
+    if data.get('overlay'):
+        result["overlay"] = [
+            dict(_curva_json(data['x'], extra['params'], extra['model_type']),
+                 model=extra['model_type'], chi2_ndof=extra['chi2_ndof'])
+            for extra in data['overlay']
+        ]
+    return result
 
-def graf_plot(data, model_type="linear"):
-    fig, ax = plt.subplots(figsize=(10, 6))
+DECIMATE_THRESHOLD = 5000
+DECIMATE_MAX_BINS = 1500
+
+def decimar_xy(x, y, dx, dy, n_bins):
+    """Aggregate points into n_bins equal-width x bins (empty bins dropped).
+
+    Per bin: center x, min/max/mean y, and the RMS of dx/dy, all from one
+    sort plus bincount/reduceat passes.
+    """
+    lo, hi = float(np.min(x)), float(np.max(x))
+    span = hi - lo if hi > lo else 1.0
+    idx = np.minimum(((x - lo) / span * n_bins).astype(np.int64), n_bins - 1)
+
+    counts = np.bincount(idx, minlength=n_bins)
+    filled = counts > 0
+    n = counts[filled]
+    order = np.argsort(idx, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    y_sorted = y[order]
+
+    def mean_of(v):
+        return np.bincount(idx, weights=v, minlength=n_bins)[filled] / n
+
+    return {
+        "x": mean_of(x),
+        "y_mean": mean_of(y),
+        "y_min": np.minimum.reduceat(y_sorted, starts),
+        "y_max": np.maximum.reduceat(y_sorted, starts),
+        "dx": np.sqrt(mean_of(dx * dx)),
+        "dy": np.sqrt(mean_of(dy * dy)),
+        "n": n,
+    }
+
+def graf_plot(data, model_type="linear", fmt="png", dpi=PLOT_DPI, size=(10, 6), raw=False):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=size)
+    ax = fig.subplots()
 
     x = np.array(data['x'], dtype=float)
     y = np.array(data['y'], dtype=float)
     dx = np.array(data['dx'], dtype=float)
     dy = np.array(data['dy'], dtype=float)
 
-    plt.errorbar(x, y, yerr=dy, xerr=dx, fmt="ok", label="Datos", capsize=3, markersize=5)
+    if len(x) > DECIMATE_THRESHOLD:
+        # One bin per pixel column: min/max envelope plus the bin mean with
+        # the bin's RMS error bar, so drawing cost doesn't grow with N
+        n_bins = int(min(size[0] * dpi, DECIMATE_MAX_BINS))
+        b = decimar_xy(x, y, dx, dy, n_bins)
+        ax.vlines(b['x'], b['y_min'], b['y_max'], color='0.6', linewidth=1, label=f"Datos (N={len(x)}, rango por bin)")
+        ax.errorbar(b['x'], b['y_mean'], yerr=b['dy'], fmt="o", color='k', markersize=2,
+                    elinewidth=0.6, capsize=0, label="Media por bin")
+    else:
+        ax.errorbar(x, y, yerr=dy, xerr=dx, fmt="ok", label="Datos", capsize=3, markersize=5)
 
-    margin = 0.1 * (max(x) - min(x)) if max(x) != min(x) else 1
-    x_fit = np.linspace(min(x) - margin, max(x) + margin, 200)
+    x_fit, y_fit, label = curva_ajuste(x, data['params'], model_type)
 
-    params = data['params']
-    if model_type == "quadratic":
-        a, b, c = params['a']['value'], params['b']['value'], params['c']['value']
-        y_fit = funcion_cuadratica(x_fit, a, b, c)
-        label = f"y = {a:.3e}x² + {b:.3e}x + {c:.3e}"
-    elif model_type == "exponential":
-        a, b = params['a']['value'], params['b']['value']
-        y_fit = funcion_exponencial(x_fit, a, b)
-        label = f"y = {a:.3e}·e^({b:.3e}x)"
-    else:
-        a, b = params['a']['value'], params['b']['value']
-        y_fit = funcion_lineal(x_fit, a, b)
-        label = f"y = {a:.3e}x + {b:.3e}"
+    ax.plot(x_fit, y_fit, '-', color='#6c63ff', linewidth=2, label=label)
 
-    plt.plot(x_fit, y_fit, '-', color='#6c63ff', linewidth=2, label=label)
+    # Other candidate models of a comparison, drawn thinner behind the winner
+    for color, extra in zip(OVERLAY_COLORS, data.get('overlay', ())):
+        xo, yo, lo = curva_ajuste(x, extra['params'], extra['model_type'])
+        ax.plot(xo, yo, '--', color=color, linewidth=1.4, label=f"{lo} (χ²/ν = {extra['chi2_ndof']:.3f})")
 
-    chi2_text = r"$\chi^2 / \nu = {:.4f}$".format(data.get('chi2_ndof', 0))
+    chi2_text = chi2_texto(data.get('chi2_ndof', 0))
     ax.text(0.05, 0.95, chi2_text, transform=ax.transAxes, verticalalignment='top',
             fontsize=11, bbox=dict(boxstyle="round,pad=0.4", fc="#f0f0ff", ec="#6c63ff", alpha=0.9))
 
     ax.legend(loc="best", fontsize=10, framealpha=0.9)
-    plt.title(data.get('title', 'Ajuste'), fontsize=16, fontweight='bold')
-    plt.xlabel(data.get('xlabel', 'Eje X'), fontsize=13)
-    plt.ylabel(data.get('ylabel', 'Eje Y'), fontsize=13)
-    plt.grid(True, which='both', linestyle='--', linewidth=0.4, alpha=0.7)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=120, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
+    ax.set_title(data.get('title', 'Ajuste'), fontsize=16, fontweight='bold')
+    ax.set_xlabel(data.get('xlabel', 'Eje X'), fontsize=13)
+    ax.set_ylabel(data.get('ylabel', 'Eje Y'), fontsize=13)
+    ax.grid(True, which='both', linestyle='--', linewidth=0.4, alpha=0.7)
+    fig.tight_layout()
+    return exportar_figura(fig, fmt, dpi, raw)
 
 # ========== GAUSS HISTOGRAM ==========
 
-def gauss_plot(values):
-    fig, ax = plt.subplots(figsize=(8, 5))
-    data = np.array(values, dtype=float)
+def _media_desviacion(data, stats):
+    if stats is not None and stats.get("stdev"):
+        return stats["mean"], stats["stdev"]
     mean = np.mean(data)
     std = np.std(data, ddof=1) if len(data) > 1 else 1
+    return mean, std
 
-    n_bins = max(5, min(len(data) // 2, 20))
-    ax.hist(data, bins=n_bins, density=True, alpha=0.7,
-            color='#6c63ff', edgecolor='white', linewidth=1.2, label='Histograma')
+HIST_RULE_THRESHOLD = 200
+HIST_MAX_BINS = 200
+
+def _bins_regla(data, n):
+    """Bin count for Freedman-Diaconis (Scott when that gives fewer than two
+    bins), computed from the rule's width so that it can be capped before
+    any edges are allocated: one far outlier would otherwise ask numpy for
+    billions of them."""
+    span = np.ptp(data)
+    if not span > 0:
+        return 1
+    q75, q25 = np.percentile(data, [75, 25])
+    width = 2.0 * (q75 - q25) * n ** (-1 / 3)
+    bins = math.ceil(span / width) if width > 0 else 1
+    if bins < 2:
+        width = (24 * math.sqrt(math.pi) / n) ** (1 / 3) * np.std(data)
+        bins = math.ceil(span / width) if width > 0 else 1
+    return bins
+
+def bordes_histograma(data):
+    """Bin edges: the old 5-20 bins for small samples, Freedman-Diaconis
+    (Scott when the IQR is zero) above HIST_RULE_THRESHOLD, capped."""
+    n = len(data)
+    if n <= HIST_RULE_THRESHOLD:
+        return np.histogram_bin_edges(data, bins=max(5, min(n // 2, 20)))
+    bins = min(_bins_regla(data, n), HIST_MAX_BINS)
+    return np.histogram_bin_edges(data, bins=bins)
+
+def datos_gauss(values, stats=None):
+    """What gauss_plot draws: density histogram and normal curve samples."""
+    data = np.asarray(values, dtype=float)
+    mean, std = _media_desviacion(data, stats)
+    counts, edges = np.histogram(data, bins=bordes_histograma(data), density=True)
+    x_range = np.linspace(mean - 4 * std, mean + 4 * std, 200)
+    result = {
+        "bin_edges": edges.tolist(),
+        "bin_density": counts.tolist(),
+        "x_curve": x_range.tolist(),
+        "y_curve": normal_pdf(x_range, mean, std).tolist(),
+        "mean": safe_float(mean),
+    }
+    fit = (stats or {}).get("fit")
+    if fit:
+        result["y_fit"] = normal_pdf(x_range, fit["params"]["mean"]["value"], fit["params"]["sigma"]["value"]).tolist()
+    return result
+
+def gauss_plot(values, stats=None, fmt="png", dpi=PLOT_DPI, size=(8, 5), raw=False):
+    """Histogram with the normal curve; ``stats`` (fgaus output) avoids
+    recomputing the mean and stdev."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=size)
+    ax = fig.subplots()
+    data = np.asarray(values, dtype=float)
+    mean, std = _media_desviacion(data, stats)
+
+    # Bin once with NumPy and draw bars; cost is per bin, not per sample
+    density, edges = np.histogram(data, bins=bordes_histograma(data), density=True)
+    ax.bar(edges[:-1], density, width=np.diff(edges), align='edge', alpha=0.7,
+           color='#6c63ff', edgecolor='white', linewidth=1.2 if len(density) <= 50 else 0, label='Histograma')
 
     x_range = np.linspace(mean - 4 * std, mean + 4 * std, 200)
-    ax.plot(x_range, norm.pdf(x_range, mean, std), '-', color='#00d4aa', linewidth=2.5, label='Curva Normal')
+    ax.plot(x_range, normal_pdf(x_range, mean, std), '-', color='#00d4aa', linewidth=2.5, label='Curva Normal')
+    fit = (stats or {}).get("fit")
+    if fit:
+        mu, sigma = fit["params"]["mean"]["value"], fit["params"]["sigma"]["value"]
+        ax.plot(x_range, normal_pdf(x_range, mu, sigma), '--', color='#e4572e', linewidth=2,
+                label=f'Ajuste ($\\chi^2/\\nu$ = {fit["chi2_ndof"]:.3g})')
     ax.axvline(mean, color='#ff4d6a', linestyle='--', linewidth=1.5, label=f'Media = {mean:.4g}')
 
     ax.legend(loc='best', fontsize=10, framealpha=0.9)
@@ -161,13 +915,8 @@ def gauss_plot(values):
     ax.set_xlabel('Valor', fontsize=12)
     ax.set_ylabel('Densidad', fontsize=12)
     ax.grid(True, linestyle='--', alpha=0.4)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=120, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
+    fig.tight_layout()
+    return exportar_figura(fig, fmt, dpi, raw)
 
 # ========== ERROR PROPAGATION ==========
 
@@ -226,11 +975,296 @@ def ErrorPorcentual(theo, d_theo, exp, d_exp):
 
     return safe_dict({"value": percent, "uncertainty": 0.0})
 
+# ========== VECTORIZED PROPAGATION ==========
+
+def _vec_suma(x, dx, y, dy, n, a):
+    return x + y, np.sqrt(dx ** 2 + dy ** 2), None
+
+def _vec_resta(x, dx, y, dy, n, a):
+    return x - y, np.sqrt(dx ** 2 + dy ** 2), None
+
+def _vec_producto(x, dx, y, dy, n, a):
+    xy = x * y
+    zero = (x == 0) | (y == 0)
+    xs = np.where(zero, 1.0, x)
+    ys = np.where(zero, 1.0, y)
+    dxy = np.where(zero, 0.0, np.abs(xy) * np.sqrt((dx / xs) ** 2 + (dy / ys) ** 2))
+    return xy, dxy, None
+
+def _vec_division(x, dx, y, dy, n, a):
+    bad = y == 0
+    ys = np.where(bad, 1.0, y)
+    xs = np.where(x == 0, 1.0, x)
+    xy = x / ys
+    dxy = np.where(x != 0, np.abs(xy) * np.sqrt((dx / xs) ** 2 + (dy / ys) ** 2), np.abs(dx / ys))
+    return xy, dxy, (bad, "División por cero")
+
+def _vec_potencia(x, dx, y, dy, n, a):
+    return np.power(x, n), np.abs(n * np.power(x, n - 1)) * dx, None
+
+def _vec_constante(x, dx, y, dy, n, a):
+    return a * x, np.abs(a) * dx, None
+
+def _vec_exponente(x, dx, y, dy, n, a):
+    ex = np.exp(x)
+    return ex, ex * dx, None
+
+def _vec_cos(x, dx, y, dy, n, a):
+    return np.cos(x), np.abs(np.sin(x)) * dx, None
+
+def _vec_sin(x, dx, y, dy, n, a):
+    return np.sin(x), np.abs(np.cos(x)) * dx, None
+
+def _vec_ln(x, dx, y, dy, n, a):
+    bad = x <= 0
+    xs = np.where(bad, 1.0, x)
+    return np.log(xs), dx / xs, (bad, "Log de número no positivo")
+
+def _vec_error_porcentual(x, dx, y, dy, n, a):
+    bad = x == 0
+    xs = np.where(bad, 1.0, x)
+    return np.abs(x - y) / np.abs(xs) * 100, np.zeros_like(x), (bad, "Valor teórico no puede ser cero")
+
+VECTOR_OPS = {
+    "suma": _vec_suma,
+    "resta": _vec_resta,
+    "producto": _vec_producto,
+    "division": _vec_division,
+    "potencia": _vec_potencia,
+    "constante": _vec_constante,
+    "exponente": _vec_exponente,
+    "cos": _vec_cos,
+    "sin": _vec_sin,
+    "ln": _vec_ln,
+    "error_porcentual": _vec_error_porcentual,
+}
+
+def propagacion_lote(operations, x, dx, y, dy, n, a):
+    """Vectorized error propagation over row arrays.
+
+    ``operations`` is a single operation name or one name per row. Rows that
+    fall outside an operation's domain are masked and reported in ``errors``
+    with value and uncertainty set to 0, like the scalar functions do. Rows
+    whose result is not finite (overflow, 0 to a negative power, roots of
+    negatives...) are reported too, with value and uncertainty null.
+    """
+    x = np.asarray(x, dtype=float)
+    size = len(x)
+    cols = [np.broadcast_to(np.asarray(c, dtype=float), (size,)) for c in (dx, y, dy, n, a)]
+
+    value = np.zeros(size)
+    uncertainty = np.zeros(size)
+    errors = np.full(size, None, dtype=object)
+
+    ops = np.asarray(operations, dtype=object)
+    if ops.ndim == 0:
+        groups = [(str(ops).lower(), slice(None))]
+    else:
+        ops = np.array([str(o).lower() for o in ops], dtype=object)
+        groups = [(op, ops == op) for op in np.unique(ops)]
+
+    with np.errstate(all="ignore"):
+        for op, rows in groups:
+            func = VECTOR_OPS[op]
+            val, unc, invalid = func(x[rows], *(c[rows] for c in cols))
+            if invalid is not None:
+                mask, message = invalid
+                val = np.where(mask, 0.0, val)
+                unc = np.where(mask, 0.0, unc)
+                sub = errors[rows]
+                sub[mask] = message
+                errors[rows] = sub
+            value[rows] = val
+            uncertainty[rows] = unc
+
+    bad = ~(np.isfinite(value) & np.isfinite(uncertainty))
+    for i in np.flatnonzero(bad):
+        errors[i] = errors[i] or "Resultado no finito (fuera de dominio o desbordamiento)"
+    value = value.astype(object)
+    uncertainty = uncertainty.astype(object)
+    value[bad] = None
+    uncertainty[bad] = None
+    return {
+        "value": value.tolist(),
+        "uncertainty": uncertainty.tolist(),
+        "errors": errors.tolist(),
+        "n": size,
+    }
+
 def fgaus(x_list):
     n = len(x_list)
     if n < 2:
         return {"mean": x_list[0] if n == 1 else 0, "stdev": 0, "error": 0, "n": n}
-    vsp = stat_module.mean(x_list)
-    dst = stat_module.stdev(x_list)
-    dx = dst / np.sqrt(n)
-    return safe_dict({"mean": vsp, "stdev": dst, "error": dx, "n": n})
+    return GaussAcumulador(bins=0).update(x_list).resumen()
+
+# ========== STREAMING GAUSS ==========
+
+class GaussAcumulador:
+    """Mergeable running statistics (Welford/Chan) for a 1-D sample.
+
+    Each chunk is reduced with one vectorized pass and folded into the running
+    count/mean/M2, so the full sample never has to be in memory. The histogram
+    has fixed edges: given explicitly as ``range_`` or taken from the first
+    chunk; later values outside it go to underflow/overflow. ``bins=0``
+    skips the histogram.
+    """
+
+    def __init__(self, bins=20, range_=None):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.bins = bins
+        self.edges = None if range_ is None or not bins else np.linspace(range_[0], range_[1], bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, chunk):
+        data = np.asarray(chunk, dtype=float).ravel()
+        data = data[np.isfinite(data)]
+        n_b = len(data)
+        if n_b == 0:
+            return self
+        mean_b = float(data.mean())
+        m2_b = float(np.sum((data - mean_b) ** 2))
+
+        min_b, max_b = float(data.min()), float(data.max())
+
+        if self.bins:
+            if self.edges is None:
+                lo, hi = (min_b, max_b) if min_b != max_b else (min_b - 0.5, max_b + 0.5)
+                self.edges = np.linspace(lo, hi, self.bins + 1)
+            counts, _ = np.histogram(data, bins=self.edges)
+            self.counts += counts
+            self.underflow += int(np.count_nonzero(data < self.edges[0]))
+            self.overflow += int(np.count_nonzero(data > self.edges[-1]))
+
+        self._combine(n_b, mean_b, m2_b, min_b, max_b)
+        return self
+
+    def _combine(self, n_b, mean_b, m2_b, min_b, max_b):
+        n_a = self.n
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * n_a * n_b / n
+        self.n = n
+        self.min = min(self.min, min_b)
+        self.max = max(self.max, max_b)
+
+    def merge(self, other):
+        """Fold another accumulator (with the same histogram edges) into this one."""
+        if other.n == 0:
+            return self
+        if self.edges is None:
+            self.edges = other.edges
+        elif other.edges is not None and not np.array_equal(self.edges, other.edges):
+            raise ValueError("Los histogramas deben tener los mismos bordes")
+        self.counts = self.counts + other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self._combine(other.n, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def resumen(self):
+        """Same fields as fgaus: mean, stdev (n-1), error of the mean, n."""
+        if self.n < 2:
+            return {"mean": self.mean if self.n == 1 else 0, "stdev": 0, "error": 0, "n": self.n}
+        dst = math.sqrt(self.m2 / (self.n - 1))
+        return safe_dict({"mean": self.mean, "stdev": dst, "error": dst / math.sqrt(self.n), "n": self.n})
+
+    def ajuste(self):
+        """Binned-likelihood Gaussian fit of the accumulated histogram."""
+        if self.edges is None:
+            raise ValueError("El histograma está vacío")
+        return ajuste_gauss_binned(self.counts, self.edges, self.resumen())
+
+    def to_dict(self):
+        result = self.resumen()
+        result.update({
+            "min": safe_float(self.min) if self.n else 0,
+            "max": safe_float(self.max) if self.n else 0,
+            "histogram": {
+                "edges": [] if self.edges is None else self.edges.tolist(),
+                "counts": self.counts.tolist(),
+                "underflow": self.underflow,
+                "overflow": self.overflow,
+            },
+        })
+        return result
+
+# ========== GAUSS FIT ==========
+# Fit of a normal distribution to histogram counts with iminuit's extended
+# binned likelihood: the sample is binned once (np.histogram, or the counts of
+# a GaussAcumulador), after which every evaluation costs O(bins) whatever the
+# sample size. The model is amplitude * (CDF(upper edge) - CDF(lower edge)),
+# so amplitude is the expected number of samples in the whole distribution,
+# tails outside the binned range included.
+
+GAUSS_FIT_PARAMS = ("amplitude", "mean", "sigma")
+GAUSS_FIT_MIN_COUNTS = 10
+
+def _cdf_escalada(xe, amplitude, mean, sigma):
+    return amplitude * normal_cdf(xe, mean, sigma)
+
+def _grad_cdf_escalada(xe, amplitude, mean, sigma):
+    z = (xe - mean) / sigma
+    pdf = np.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+    return np.vstack([normal_cdf(xe, mean, sigma), -amplitude * pdf / sigma, -amplitude * pdf * z / sigma])
+
+def ajuste_gauss_binned(counts, edges, stats=None):
+    """Fit amplitude, mean and sigma to histogram ``counts`` over ``edges``;
+    ``stats`` (fgaus/GaussAcumulador.resumen output) gives the starting point."""
+    from iminuit import Minuit, cost
+
+    counts = np.asarray(counts, dtype=float)
+    edges = np.asarray(edges, dtype=float)
+    nbins = len(counts)
+    total = counts.sum()
+    if nbins <= len(GAUSS_FIT_PARAMS):
+        raise ValueError(f"Se necesitan más de {len(GAUSS_FIT_PARAMS)} bins para el ajuste")
+    if total < GAUSS_FIT_MIN_COUNTS:
+        raise ValueError(f"Se necesitan al menos {GAUSS_FIT_MIN_COUNTS} datos en el histograma para el ajuste")
+
+    centers = 0.5 * (edges[1:] + edges[:-1])
+    if stats is not None and stats.get("stdev"):
+        mean0, sigma0 = stats["mean"], stats["stdev"]
+    else:
+        mean0 = float(np.sum(counts * centers) / total)
+        sigma0 = float(np.sqrt(np.sum(counts * (centers - mean0) ** 2) / total)) or float(np.diff(edges).mean())
+
+    nll = cost.ExtendedBinnedNLL(counts, edges, _cdf_escalada, grad=_grad_cdf_escalada)
+    m = Minuit(nll, amplitude=total, mean=mean0, sigma=sigma0, name=GAUSS_FIT_PARAMS)
+    m.limits["amplitude"] = (0, None)
+    m.limits["sigma"] = (0, None)
+    m.errors["amplitude"] = max(math.sqrt(total), 1.0)
+    m.errors["mean"] = m.errors["sigma"] = sigma0 * 0.1
+    m.strategy = 0
+    with metrics.etapa("migrad"):
+        m.migrad()
+    with metrics.etapa("hesse"):
+        m.hesse()
+    metrics.minuit("gauss", m.nfcn)
+
+    # The binned NLL is in the Baker-Cousins form: asymptotically chi2-distributed
+    chi2_val = float(m.fval)
+    ndof = nbins - len(GAUSS_FIT_PARAMS)
+    return safe_dict({
+        "method": "binned_nll",
+        "params": {name: {"value": m.values[name], "error": m.errors[name]} for name in GAUSS_FIT_PARAMS},
+        "chi2": chi2_val,
+        "ndof": ndof,
+        "chi2_ndof": chi2_val / ndof,
+        "bins": nbins,
+        "valid": bool(m.valid),
+    })
+
+def ajuste_gauss(values, stats=None):
+    """ajuste_gauss_binned on one np.histogram pass over ``values`` (same
+    edges as gauss_plot)."""
+    data = np.asarray(values, dtype=float)
+    data = data[np.isfinite(data)]
+    counts, edges = np.histogram(data, bins=bordes_histograma(data))
+    return ajuste_gauss_binned(counts, edges, stats)
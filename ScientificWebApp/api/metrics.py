@@ -0,0 +1,244 @@
+import bisect
+import contextvars
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# ========== METRICS ==========
+#
+# Per-request stage timings (sent back in a Server-Timing header) and
+# process-wide histograms/counters exposed in the Prometheus text format.
+# Recording a stage costs two perf_counter() calls and one locked bisect;
+# outside a request (scripts, benchmarks) stages only feed the histograms.
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Sampled profiling of slow requests: a fraction PROFILE_SAMPLE_RATE of the
+# requests still running after PROFILE_THRESHOLD_MS get their threads' stacks
+# sampled every PROFILE_INTERVAL_MS until they finish. Off by default.
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_THRESHOLD_MS = float(os.environ.get("PROFILE_THRESHOLD_MS", 1000))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_KEEP = 20
+PROFILE_TOP_STACKS = 50
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in items]
+        for label_values, (counts, total, n) in items:
+            base = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {n}")
+        return lines
+
+class CounterMetric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, k)} {v}" for k, v in items)
+        return lines
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+stage_seconds = Histogram("scihispida_stage_seconds", "Duration of request stages", STAGE_BUCKETS, ("stage",))
+request_seconds = Histogram("scihispida_request_seconds", "Request latency", STAGE_BUCKETS, ("method", "route"))
+request_bytes = Histogram("scihispida_request_bytes", "Request body size", SIZE_BUCKETS, ("route",))
+response_bytes = Histogram("scihispida_response_bytes", "Response body size (as sent)", SIZE_BUCKETS, ("route",))
+requests_total = CounterMetric("scihispida_requests_total", "Requests handled", ("method", "route", "status"))
+minuit_fits = CounterMetric("scihispida_minuit_fits_total", "Minuit minimizations", ("model",))
+minuit_calls = CounterMetric("scihispida_minuit_calls_total", "Cost function calls made by Minuit", ("model",))
+profiles_total = CounterMetric("scihispida_profiles_total", "Slow requests that were stack-sampled")
+jobs_total = CounterMetric("scihispida_jobs_total", "Background jobs finished", ("kind", "status"))
+
+ALL = (stage_seconds, request_seconds, request_bytes, response_bytes, requests_total,
+       minuit_fits, minuit_calls, profiles_total, jobs_total)
+
+# ----- stages -----
+
+class _Peticion:
+    __slots__ = ("start", "timings")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = []
+
+def iniciar_peticion():
+    """Start collecting stage timings for the current request; returns the token
+    for terminar_peticion()."""
+    return _current.set(_Peticion())
+
+def terminar_peticion(token):
+    current = _current.get()
+    _current.reset(token)
+    return current.timings if current is not None else []
+
+def registrar(stage, seconds):
+    stage_seconds.observe(seconds, stage)
+    current = _current.get()
+    if current is not None:
+        current.timings.append((stage, seconds))
+
+def desde_inicio(stage):
+    """Record the time from the start of the request until now as ``stage``
+    (e.g. reading and validating the body before the handler runs)."""
+    current = _current.get()
+    if current is not None:
+        registrar(stage, time.perf_counter() - current.start)
+
+@contextmanager
+def etapa(stage):
+    """Time a block as ``stage``."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(stage, time.perf_counter() - t0)
+
+def server_timing(timings, total=None):
+    """Server-Timing header value; repeated stages are summed, in first-seen order."""
+    merged = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1e3:.2f}" for stage, seconds in merged.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1e3:.2f}")
+    return ", ".join(parts)
+
+def minuit(model_type, nfcn):
+    minuit_fits.inc(1, model_type)
+    minuit_calls.inc(nfcn, model_type)
+
+def exposition():
+    lines = []
+    for metric in ALL:
+        lines.extend(metric.exposition())
+    return "\n".join(lines) + "\n"
+
+# ----- sampled profiling -----
+
+profiles = deque(maxlen=PROFILE_KEEP)
+
+_IDLE = ("threading.py", "selectors.py", "queue.py", "thread.py", "metrics.py")
+
+class MuestreoPila:
+    """Samples every thread's stack (sys._current_frames) until stopped.
+
+    Idle threads (waiting on locks, queues, selectors) are skipped; the
+    remaining stacks are counted in folded "a;b;c" form, ready for a flame
+    graph. Samples are process-wide, so concurrent requests show up too.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1e3, max_seconds=60):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack and stack[0].split(":")[0] in _IDLE:
+                    continue
+                self.stacks[";".join(reversed(stack))] += 1
+
+def perfil_si_lento(loop, method, path):
+    """Schedule stack sampling for this request if it turns out slow (and is
+    picked by the sample rate). Returns a callable to run when the request
+    finishes, or None."""
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    state = {}
+
+    def start():
+        state["sampler"] = MuestreoPila().start()
+        state["started"] = time.perf_counter()
+
+    handle = loop.call_later(PROFILE_THRESHOLD_MS / 1e3, start)
+
+    def finish(total_seconds):
+        handle.cancel()
+        sampler = state.get("sampler")
+        if sampler is None:
+            return
+        sampler.stop()
+        profiles_total.inc(1)
+        profiles.append({
+            "method": method,
+            "path": path,
+            "duration_ms": round(total_seconds * 1e3, 1),
+            "sampled_ms": round((time.perf_counter() - state["started"]) * 1e3, 1),
+            "samples": sampler.samples,
+            "stacks": dict(sampler.stacks.most_common(PROFILE_TOP_STACKS)),
+            "time": time.time(),
+        })
+    return finish
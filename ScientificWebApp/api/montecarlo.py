@@ -0,0 +1,280 @@
+import os
+import warnings
+
+import numpy as np
+
+import formula
+import logic
+
+# ========== MONTE CARLO UNCERTAINTIES ==========
+#
+# Linearized errors (first-order propagation, the Minuit Hessian) are wrong
+# for strongly nonlinear cases. Here inputs are sampled from their normal
+# uncertainties (or the data points are resampled, for the bootstrap) and the
+# spread of the results gives percentile intervals.
+#
+# Samples are drawn in chunks (at most MC_CHUNK_SAMPLES samples and
+# MC_CHUNK_ELEMENTS numbers each), each with its own child of one
+# SeedSequence, so a chunk can run on any process and a seeded run is
+# reproducible. After each round of chunks the percentiles are compared with
+# the previous round's and sampling stops once they move by less than
+# MC_RTOL of the interval width.
+
+MC_CHUNK_ELEMENTS = int(os.environ.get("MC_CHUNK_ELEMENTS", 1_000_000))
+MC_MAX_ELEMENTS = int(os.environ.get("MC_MAX_ELEMENTS", 20_000_000))  # results kept for percentiles
+MC_MIN_SAMPLES = 1000
+MC_CHUNK_SAMPLES = 5000     # samples per chunk; convergence is checked between chunks
+MC_MAX_SAMPLES = 100_000
+MC_MAX_FITS = 5000          # replicas for models that need Minuit
+MC_RTOL = 0.02
+CONFIDENCE = 0.6827         # the 1-sigma interval of a normal distribution
+METHODS = ("montecarlo", "bootstrap")
+
+class MCError(ValueError):
+    pass
+
+def validar_opciones(samples, confidence):
+    """MCError unless ``samples`` (optional) and ``confidence`` are usable."""
+    if samples is not None and samples < 2:
+        raise MCError("samples debe ser al menos 2")
+    if confidence is None or not 0 < confidence < 1:
+        raise MCError("confidence debe estar entre 0 y 1")
+
+def _validar(samples, confidence, limit):
+    validar_opciones(samples, confidence)
+    return min(samples or limit, limit)
+
+def _chunk(elements_per_sample, max_samples):
+    return max(1, min(MC_CHUNK_ELEMENTS // max(elements_per_sample, 1), MC_CHUNK_SAMPLES, max_samples))
+
+def ejecutar(task, args, chunk, max_samples, confidence=CONFIDENCE, seed=None,
+             executor=None, workers=1, rtol=MC_RTOL):
+    """Run ``task(seed_sequence, size, *args) -> (size, n_outputs)`` in chunks
+    of ``chunk`` samples until the percentile interval converges or
+    ``max_samples`` is reached.
+
+    With an executor, ``workers`` chunks are submitted per round.
+    """
+    root = np.random.SeedSequence(seed)
+    q = 50 * (1 - confidence), 50.0, 50 * (1 + confidence)
+    parts, total, prev, converged = [], 0, None, False
+    while total < max_samples:
+        sizes = []
+        for _ in range(workers if executor is not None else 1):
+            size = min(chunk, max_samples - total - sum(sizes))
+            if size > 0:
+                sizes.append(size)
+        seeds = root.spawn(len(sizes))
+        if executor is None:
+            parts.extend(task(s, size, *args) for s, size in zip(seeds, sizes))
+        else:
+            futures = [executor.submit(task, s, size, *args) for s, size in zip(seeds, sizes)]
+            parts.extend(f.result() for f in futures)
+        total += sum(sizes)
+        if total < min(MC_MIN_SAMPLES, max_samples):
+            continue
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            current = np.nanpercentile(np.concatenate(parts), q, axis=0)
+        if prev is not None:
+            width = np.abs(current[2] - current[0])
+            moved = np.abs(current - prev)
+            if np.all((moved <= rtol * width) | ~np.isfinite(moved)):
+                converged = True
+                break
+        prev = current
+
+    samples = np.concatenate(parts)
+    return resumen(samples, confidence, converged)
+
+def resumen(samples, confidence, converged):
+    """Per-output percentile interval, median, mean and std of the samples;
+    non-finite samples (outside a function's domain) are left out and counted."""
+    finite = np.isfinite(samples)
+    clean = np.where(finite, samples, np.nan)
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        # All-NaN outputs (always outside the domain) just report NaN -> 0
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, median, upper = np.nanpercentile(clean, [50 * (1 - confidence), 50.0, 50 * (1 + confidence)], axis=0)
+        mean = np.nanmean(clean, axis=0)
+        std = np.nanstd(clean, axis=0, ddof=1)
+    return {
+        "median": median,
+        "lower": lower,
+        "upper": upper,
+        "mean": mean,
+        "std": std,
+        "invalid_fraction": 1 - finite.mean(axis=0),
+        "samples": len(samples),
+        "confidence": confidence,
+        "converged": converged,
+    }
+
+def _json(summary, scalar=False):
+    """Summary arrays as JSON-safe floats (scalars when ``scalar``)."""
+    out = {}
+    for key, value in summary.items():
+        if isinstance(value, np.ndarray):
+            value = np.where(np.isfinite(value), value, 0.0)
+            out[key] = float(value[0]) if scalar else value.tolist()
+        else:
+            out[key] = value
+    return out
+
+# ----- propagation -----
+
+def _tarea_operaciones(seed, size, groups, x, dx, y, dy, n, a):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(x, np.abs(dx), (size, len(x)))
+    Y = rng.normal(y, np.abs(dy), (size, len(x)))
+    out = np.empty((size, len(x)))
+    with np.errstate(all="ignore"):
+        for op, rows in groups:
+            val, _, invalid = logic.VECTOR_OPS[op](X[:, rows], dx[rows], Y[:, rows], dy[rows], n[rows], a[rows])
+            if invalid is not None:
+                val = np.where(invalid[0], np.nan, val)
+            out[:, rows] = val
+    return out
+
+def propagacion_montecarlo(operations, x, dx, y, dy, n, a, samples=None,
+                           confidence=CONFIDENCE, seed=None):
+    """Monte Carlo counterpart of logic.propagacion_lote: x and y are drawn
+    from N(x, dx) and N(y, dy) per row; n and a are exact."""
+    x = np.asarray(x, dtype=float)
+    size = len(x)
+    dx, y, dy, n, a = (np.broadcast_to(np.asarray(c, dtype=float), (size,)) for c in (dx, y, dy, n, a))
+    max_samples = _validar(samples, confidence, min(MC_MAX_SAMPLES, max(2, MC_MAX_ELEMENTS // max(size, 1))))
+
+    ops = np.asarray(operations, dtype=object)
+    if ops.ndim == 0:
+        groups = [(str(ops).lower(), np.arange(size))]
+    else:
+        ops = np.array([str(o).lower() for o in ops], dtype=object)
+        groups = [(op, np.flatnonzero(ops == op)) for op in np.unique(ops)]
+
+    summary = ejecutar(_tarea_operaciones, (groups, x, dx, y, dy, n, a), _chunk(size, max_samples),
+                       max_samples, confidence, seed)
+    return _json(summary)
+
+def _tarea_formula(seed, size, text, values, uncertainties, shape):
+    compiled = formula.compile_formula(text)
+    rng = np.random.default_rng(seed)
+    drawn = {
+        v: rng.normal(values[v], np.abs(uncertainties.get(v, 0.0)), (size,) + shape)
+        for v in compiled.variables
+    }
+    value, _ = compiled.evaluate(drawn)
+    return np.broadcast_to(value, (size,) + shape).reshape(size, -1)
+
+def formula_montecarlo(text, values, uncertainties, samples=None, confidence=CONFIDENCE, seed=None):
+    """Monte Carlo interval for a formula with independent normal inputs."""
+    compiled = formula.compile_formula(text)
+    missing = [v for v in compiled.variables if v not in values]
+    if missing:
+        raise formula.FormulaError(f"Faltan valores para: {', '.join(missing)}")
+    values = {k: np.asarray(v, dtype=float) for k, v in values.items()}
+    uncertainties = {k: np.asarray(v, dtype=float) for k, v in uncertainties.items()}
+    shape = formula.forma_comun(values, compiled.variables, uncertainties)
+    n_outputs = int(np.prod(shape)) if shape else 1
+    max_samples = _validar(samples, confidence, min(MC_MAX_SAMPLES, max(2, MC_MAX_ELEMENTS // n_outputs)))
+    summary = ejecutar(_tarea_formula, (text, values, uncertainties, shape),
+                       _chunk(n_outputs, max_samples), max_samples, confidence, seed)
+    return _json(summary, scalar=not shape)
+
+# ----- fits -----
+
+def _replicas(rng, size, x, y, dx, dy, method):
+    """(X, Y, DX, DY) for ``size`` replicas, each of shape (size, N)."""
+    if method == "bootstrap":
+        idx = rng.integers(0, len(x), (size, len(x)))
+        return x[idx], y[idx], dx[idx], dy[idx]
+    shape = (size, len(x))
+    X = rng.normal(x, np.abs(dx), shape) if np.any(dx) else np.broadcast_to(x, shape)
+    return X, rng.normal(y, np.abs(dy), shape), np.broadcast_to(dx, shape), np.broadcast_to(dy, shape)
+
+def _ajuste_lineal_lote(mod, X, Y, DY):
+    """Closed-form weighted least squares for a batch of replicas at once."""
+    size, N = X.shape
+    A = mod.design(X.ravel()).reshape(size, N, -1)
+    W = 1.0 / np.where(DY == 0, 1e-10, DY) ** 2
+    M = np.einsum("bn,bni,bnj->bij", W, A, A)
+    v = np.einsum("bn,bni,bn->bi", W, A, Y)
+    try:
+        return np.linalg.solve(M, v[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # A degenerate replica (e.g. a bootstrap sample with one distinct x)
+        out = np.full(v.shape, np.nan)
+        for b in range(size):
+            try:
+                out[b] = np.linalg.solve(M[b], v[b])
+            except np.linalg.LinAlgError:
+                pass
+        return out
+
+def _tarea_ajuste(seed, size, x, y, dx, dy, model_type, method, inicio, pasos, use_dx=False):
+    mod = logic.MODELOS[model_type]
+    rng = np.random.default_rng(seed)
+    X, Y, DX, DY = _replicas(rng, size, x, y, dx, dy, method)
+    if _lote(mod, dx, use_dx):
+        return _ajuste_lineal_lote(mod, X, Y, DY)
+    out = np.full((size, len(mod.params)), np.nan)
+    for b in range(size):
+        try:
+            stats = logic.funcionChi2(X[b], Y[b], DY[b], mod.func, model_type, inicio=inicio, pasos=pasos,
+                                      xerr=DX[b] if use_dx else None)
+            out[b] = [stats['params'][p]['value'] for p in mod.params]
+        except Exception:
+            pass
+    return out
+
+def _lote(mod, dx, use_dx):
+    """Whether replicas can be refit with the batched closed-form solve: the
+    model is linear in its parameters and dx doesn't enter the weights."""
+    return mod.design is not None and not (use_dx and np.any(dx))
+
+def ajuste_montecarlo(x, y, dx, dy, model_type, stats, method="montecarlo", samples=None,
+                      confidence=CONFIDENCE, seed=None, executor=None, workers=1, use_dx=False):
+    """Percentile intervals for fitted parameters.
+
+    ``montecarlo`` redraws y (and x, when dx is given) from the data
+    uncertainties; ``bootstrap`` resamples the points with replacement. Models
+    linear in their parameters refit every chunk of replicas with one batched
+    solve; the others run Minuit per replica, warm-started from ``stats``
+    (the nominal fit), which is where ``executor`` pays off. With ``use_dx``
+    each replica is refit errors-in-variables like the nominal fit, so it
+    takes the per-replica path too.
+    """
+    if method not in METHODS:
+        raise MCError(f"Método inválido (usa {', '.join(METHODS)})")
+    mod = logic.MODELOS[model_type]
+    x, y, dx, dy = (np.asarray(c, dtype=float) for c in (x, y, dx, dy))
+    batched = _lote(mod, dx, use_dx)
+    limit = MC_MAX_SAMPLES if batched else MC_MAX_FITS
+    limit = min(limit, max(2, MC_MAX_ELEMENTS // max(len(x), 1)))
+    max_samples = _validar(samples, confidence, limit)
+    inicio = {p: stats['params'][p]['value'] for p in mod.params}
+    pasos = {p: stats['params'][p]['error'] for p in mod.params}
+
+    if batched:
+        # One batched solve per chunk is faster than shipping arrays to processes
+        executor = None
+        chunk = _chunk(len(x), max_samples)
+    else:
+        # Minuit replicas are slow: small chunks spread over the workers
+        chunk = min(_chunk(len(x), max_samples), 100)
+    task_args = (x, y, dx, dy, model_type, method, inicio, pasos, bool(use_dx))
+    summary = ejecutar(_tarea_ajuste, task_args, chunk, max_samples, confidence, seed,
+                       executor=executor, workers=workers)
+    result = _json(summary)
+    per_param = {
+        p: {k: (v[i] if isinstance(v, list) else v) for k, v in result.items()
+            if k not in ("samples", "confidence", "converged")}
+        for i, p in enumerate(mod.params)
+    }
+    return {
+        "method": method,
+        "params": per_param,
+        "samples": summary["samples"],
+        "confidence": confidence,
+        "converged": summary["converged"],
+    }
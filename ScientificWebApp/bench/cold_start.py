@@ -0,0 +1,108 @@
+"""Cold-start benchmark for the API.
+
+Each endpoint is exercised in a fresh interpreter: the time from importing
+``index`` to the first response is what a serverless cold start pays. Results
+are compared against ``cold_start_budget.json``; the script exits non-zero
+when an endpoint is slower than its budget times the tolerance.
+
+    python bench/cold_start.py              # check against the budget
+    python bench/cold_start.py --update     # record the current numbers
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(HERE), "api")
+BUDGET_FILE = os.path.join(HERE, "cold_start_budget.json")
+
+HEAVY_MODULES = ["pandas", "matplotlib", "iminuit", "scipy"]
+
+# endpoint -> (method, path, request kwargs)
+ENDPOINTS = {
+    "calculate": ("post", "/api/calculate", {"json": {"operation": "suma", "x": 1, "dx": 0.1, "y": 2, "dy": 0.2}}),
+    "calculate_batch": ("post", "/api/calculate/batch", {"json": {"operation": "ln", "x": [1, 2], "dx": [0.1, 0.1]}}),
+    "formula": ("post", "/api/formula", {"json": {"formula": "x*sin(y)", "values": {"x": 1, "y": 2}}}),
+    "fit": ("post", "/api/fit", {"json": {"x": [1, 2, 3], "y": [1, 2, 3.1], "dx": [0, 0, 0], "dy": [0.1, 0.1, 0.1]}}),
+    "fit_exponential": ("post", "/api/fit", {"json": {"x": [1, 2, 3], "y": [1, 2.7, 7.4], "dx": [0, 0, 0],
+                                                      "dy": [0.1, 0.1, 0.1], "model": "exponential"}}),
+    "gauss": ("post", "/api/gauss", {"json": {"values": [1, 2, 3, 2.5]}}),
+    "upload": ("post", "/api/upload", {"files": {"file": ("d.csv", b"X;Y\n1;2\n3;4\n", "text/csv")}}),
+}
+
+CHILD = r"""
+import json, sys, time
+import httpx  # test-client transport, not part of the app's cold start
+sys.path.insert(0, {api_dir!r})
+method, path, kwargs = json.loads({spec!r})
+if "files" in kwargs:
+    kwargs["files"] = {{k: (v[0], v[1].encode(), v[2]) for k, v in kwargs["files"].items()}}
+t0 = time.perf_counter()
+import index
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+r = getattr(TestClient(index.app), method)(path, **kwargs)
+t2 = time.perf_counter()
+print(json.dumps({{
+    "status": r.status_code,
+    "import_ms": (t1 - t0) * 1e3,
+    "total_ms": (t2 - t0) * 1e3,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+def measure(name, repeats):
+    method, path, kwargs = ENDPOINTS[name]
+    if "files" in kwargs:
+        kwargs = {"files": {k: (v[0], v[1].decode(), v[2]) for k, v in kwargs["files"].items()}}
+    code = CHILD.format(api_dir=API_DIR, spec=json.dumps([method, path, kwargs]), heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r["total_ms"])
+    if best["status"] != 200:
+        raise RuntimeError(f"{name}: HTTP {best['status']}")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="write the current numbers as the budget")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor (default 1.5)")
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per endpoint; best is kept")
+    parser.add_argument("endpoints", nargs="*", default=list(ENDPOINTS))
+    args = parser.parse_args()
+
+    budget = {}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as f:
+            budget = json.load(f)
+
+    results = {}
+    failed = []
+    print(f"{'endpoint':<18}{'import ms':>11}{'total ms':>11}{'budget ms':>11}  heavy modules")
+    for name in args.endpoints:
+        r = measure(name, args.repeats)
+        results[name] = round(r["total_ms"], 1)
+        limit = budget.get(name)
+        status = ""
+        if limit is not None and not args.update and r["total_ms"] > limit * args.tolerance:
+            failed.append(name)
+            status = "  REGRESSION"
+        print(f"{name:<18}{r['import_ms']:>11.1f}{r['total_ms']:>11.1f}"
+              f"{(limit if limit is not None else float('nan')):>11.1f}  {','.join(r['heavy']) or '-'}{status}")
+
+    if args.update:
+        budget.update(results)
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Budget written to {BUDGET_FILE}")
+    elif failed:
+        print(f"Cold start regressed for: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
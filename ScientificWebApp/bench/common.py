@@ -0,0 +1,45 @@
+"""Shared helpers for the benchmark scripts: baseline files and percentiles."""
+import json
+import os
+import platform
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(HERE), "api")
+
+def use_api():
+    """Make the API modules importable (``import logic``, ``import index``)."""
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+def save_baseline(path, results):
+    """Merge ``results`` into the baseline file, noting the machine it came from."""
+    merged = load_baseline(path)
+    merged.update(results)
+    with open(path, "w") as f:
+        json.dump({
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "results": merged,
+        }, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+def slower(current, base, tolerance):
+    """True when ``current`` (a time) exceeds the baseline by more than ``tolerance``x."""
+    return base is not None and current > base * tolerance
@@ -0,0 +1,175 @@
+"""End-to-end load test for the API.
+
+Starts the FastAPI app under a local uvicorn (or targets ``--url``) and
+drives each scenario with ``--concurrency`` concurrent clients for
+``--duration`` seconds, reporting throughput and p50/p95/p99 latency.
+Payloads are jittered per request so the server's result caches don't turn
+the run into a cache benchmark (``--cached`` disables that). Results are
+compared against ``load_baseline.json``: a scenario regresses when its p95
+latency grows, or its throughput drops, by more than the tolerance factor.
+
+    python bench/load.py                           # check against the baseline
+    python bench/load.py --update                  # record the current numbers
+    python bench/load.py --concurrency 32 fit gauss
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+import common
+
+BASELINE_FILE = os.path.join(common.HERE, "load_baseline.json")
+
+def _fit_body(rng, n, render, model="linear"):
+    x = np.linspace(0, 10, n)
+    dy = np.full(n, 0.5)
+    y = 2 * x + 1 + rng.normal(0, 0.5, n)
+    return {"json": {"x": x.tolist(), "y": y.tolist(), "dx": [0.0] * n, "dy": dy.tolist(),
+                     "model": model, "render": render}}
+
+def _csv(rng, n):
+    x = np.linspace(0, 10, n)
+    y = 2 * x + 1 + rng.normal(0, 0.5, n)
+    lines = ["X;Y;EX;EY"] + [f"{a:.6g};{b:.6g};0;0.5" for a, b in zip(x, y)]
+    return "\n".join(lines).encode()
+
+# scenario -> (method, path, payload factory(rng))
+SCENARIOS = {
+    "calculate": ("post", "/api/calculate", lambda rng: {"json": {
+        "operation": "producto", "x": float(rng.uniform(1, 2)), "dx": 0.1, "y": 3.0, "dy": 0.2}}),
+    "fit": ("post", "/api/fit", lambda rng: _fit_body(rng, 200, "none")),
+    "fit_png": ("post", "/api/fit", lambda rng: _fit_body(rng, 200, "png")),
+    "fit_exponential": ("post", "/api/fit", lambda rng: _fit_body(rng, 200, "none", "exponential")),
+    "gauss": ("post", "/api/gauss", lambda rng: {"json": {
+        "values": rng.normal(10, 2, 1000).tolist(), "render": "none"}}),
+    "gauss_png": ("post", "/api/gauss", lambda rng: {"json": {
+        "values": rng.normal(10, 2, 1000).tolist(), "render": "png"}}),
+    "upload": ("post", "/api/upload", lambda rng: {"files": {
+        "file": ("data.csv", _csv(rng, 2000), "text/csv")}, "params": {"inline": "false"}}),
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workers):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "index:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=common.API_DIR,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited during start-up")
+        try:
+            httpx.get(url + "/", timeout=1)
+            return proc, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start within 60 s")
+
+async def run_scenario(url, name, concurrency, duration, warmup, cached):
+    method, path, factory = SCENARIOS[name]
+    latencies, errors = [], 0
+    fixed = factory(np.random.default_rng(0)) if cached else None
+
+    async def client(worker, client_http, stop_at, record):
+        nonlocal errors
+        rng = np.random.default_rng(worker + 1)
+        while time.perf_counter() < stop_at:
+            kwargs = fixed or factory(rng)
+            t0 = time.perf_counter()
+            try:
+                r = await getattr(client_http, method)(path, **kwargs)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if record:
+                if ok:
+                    latencies.append((time.perf_counter() - t0) * 1e3)
+                else:
+                    errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client_http:
+        if warmup:
+            stop = time.perf_counter() + warmup
+            await asyncio.gather(*(client(i, client_http, stop, False) for i in range(concurrency)))
+        start = time.perf_counter()
+        stop = start + duration
+        await asyncio.gather(*(client(i, client_http, stop, True) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": common.percentile(latencies, 50),
+        "p95_ms": common.percentile(latencies, 95),
+        "p99_ms": common.percentile(latencies, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of starting uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds per scenario")
+    parser.add_argument("--cached", action="store_true", help="repeat one payload instead of jittering")
+    parser.add_argument("--update", action="store_true", help="write the current numbers as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor (default 1.5)")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (available: {', '.join(SCENARIOS)})")
+
+    proc, url = (None, args.url) if args.url else start_server(args.workers)
+    baseline = common.load_baseline(BASELINE_FILE)
+    results, failed = {}, []
+    try:
+        print(f"{'scenario':<18}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'base p95':>10}")
+        for name in args.scenarios:
+            r = asyncio.run(run_scenario(url, name, args.concurrency, args.duration, args.warmup, args.cached))
+            # Baselines are only comparable at the same concurrency
+            key = f"{name}@c{args.concurrency}"
+            results[key] = {k: round(v, 3) if isinstance(v, float) else v for k, v in r.items()}
+            base = baseline.get(key, {})
+            status = ""
+            if not args.update and (
+                    common.slower(r["p95_ms"], base.get("p95_ms"), args.tolerance)
+                    or common.slower(base.get("throughput_rps", 0), r["throughput_rps"], args.tolerance)
+                    or r["errors"]):
+                failed.append(name)
+                status = "  REGRESSION" if not r["errors"] else "  ERRORS"
+            print(f"{name:<18}{r['throughput_rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                  f"{r['p99_ms']:>9.1f}{r['errors']:>8}{base.get('p95_ms', float('nan')):>10.1f}{status}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    if args.update:
+        common.save_baseline(BASELINE_FILE, results)
+        print(f"Baseline written to {BASELINE_FILE}")
+    elif failed:
+        print(f"Regressions: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Micro-benchmarks for the API's compute paths.
+
+Times ``logic.funcionChi2`` for every registered model over a range of N,
+``graf_plot``, ``gauss_plot``, ``fgaus``, ``ajuste_gauss`` (the Gauss cases
+also on a sample with one far outlier) and the upload parser
+(``ingest.leer_tabla``) on CSV with each separator and on Excel. Inputs are
+synthetic and seeded, so runs are comparable. Each case reports the median
+and best of several repetitions; the median is compared against
+``micro_baseline.json`` and the script exits non-zero when a case is slower
+than its baseline times the tolerance.
+
+    python bench/micro.py                    # check against the baseline
+    python bench/micro.py --update           # record the current numbers
+    python bench/micro.py --max-n 10000 fit  # only cases whose name contains "fit"
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import common
+
+common.use_api()
+import logic  # noqa: E402
+import ingest  # noqa: E402
+
+BASELINE_FILE = os.path.join(common.HERE, "micro_baseline.json")
+SIZES = (10, 1_000, 100_000, 1_000_000)
+
+# True parameters for the synthetic data of each model
+TRUTH = {
+    "linear": (2.0, 1.0),
+    "quadratic": (0.5, -1.0, 2.0),
+    "exponential": (2.0, 0.4),
+    "power": (3.0, 1.5),
+    "gaussian": (5.0, 2.5, 0.6),
+    "damped_oscillation": (3.0, 0.3, 4.0, 0.5),
+}
+
+def datos_modelo(model_type, n, seed=0):
+    rng = np.random.default_rng(seed)
+    mod = logic.MODELOS[model_type]
+    x = np.linspace(0.1, 5, n)
+    truth = TRUTH.get(model_type) or [mod.valores_iniciales(x, x, np.ones_like(x))[p] for p in mod.params]
+    y = mod.func(x, *truth)
+    dy = 0.05 + 0.02 * np.abs(y)
+    return x, y + rng.normal(0, dy), np.zeros(n), dy
+
+def escribir_csv(path, n, sep, seed=0):
+    x, y, dx, dy = datos_modelo("linear", n, seed)
+    table = np.column_stack((x, y, dx, dy))
+    with open(path, "w") as f:
+        f.write(sep.join(["X", "Y", "EX", "EY"]) + "\n")
+        np.savetxt(f, table, delimiter=sep, fmt="%.10g")
+
+def escribir_excel(path, n, seed=0):
+    from openpyxl import Workbook
+
+    x, y, dx, dy = datos_modelo("linear", n, seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["X", "Y", "EX", "EY"])
+    for row in zip(x.tolist(), y.tolist(), dx.tolist(), dy.tolist()):
+        ws.append(row)
+    wb.save(path)
+
+def casos(max_n, tmpdir):
+    """name -> zero-argument callable."""
+    cases = {}
+    for model_type in logic.MODELOS:
+        for n in SIZES:
+            if n > max_n:
+                continue
+            x, y, dx, dy = datos_modelo(model_type, n)
+            func = logic.MODELOS[model_type].func
+            cases[f"fit/{model_type}/{n}"] = (
+                lambda x=x, y=y, dy=dy, func=func, m=model_type: logic.funcionChi2(x, y, dy, func, m))
+
+    for n in (100, 10_000, 1_000_000):
+        if n > max_n:
+            continue
+        x, y, dx, dy = datos_modelo("linear", n)
+        stats = logic.funcionChi2(x, y, dy, logic.funcion_lineal, "linear")
+        data = {'x': x, 'y': y, 'dx': dx, 'dy': dy, 'params': stats['params'], 'chi2_ndof': stats['chi2_ndof']}
+        cases[f"graf_plot/png/{n}"] = lambda data=data: logic.graf_plot(data, "linear", fmt="png", raw=True)
+
+        values = np.random.default_rng(1).normal(10, 2, n)
+        cases[f"gauss_plot/png/{n}"] = lambda v=values: logic.gauss_plot(v, fmt="png", raw=True)
+        cases[f"fgaus/{n}"] = lambda v=values: logic.fgaus(v)
+        cases[f"ajuste_gauss/{n}"] = lambda v=values: logic.ajuste_gauss(v)
+
+    # One far outlier: the histogram rule must stay capped (no huge edge array)
+    values = np.append(np.random.default_rng(1).normal(10, 2, min(10_000, max_n)), 1e9)
+    cases[f"gauss_plot/outlier/{len(values)}"] = lambda v=values: logic.gauss_plot(v, fmt="png", raw=True)
+    cases[f"ajuste_gauss/outlier/{len(values)}"] = lambda v=values: logic.ajuste_gauss(v)
+
+    rows = min(100_000, max_n)
+    for name, sep in (("comma", ","), ("semicolon", ";"), ("tab", "\t")):
+        path = os.path.join(tmpdir, f"{name}.csv")
+        escribir_csv(path, rows, sep)
+        cases[f"upload/csv_{name}/{rows}"] = lambda p=path: ingest.leer_tabla(p, p)
+    rows = min(10_000, max_n)
+    path = os.path.join(tmpdir, "data.xlsx")
+    escribir_excel(path, rows)
+    cases[f"upload/xlsx/{rows}"] = lambda p=path: ingest.leer_tabla(p, p)
+    return cases
+
+def medir(func, min_time, max_repeats):
+    """Milliseconds per call: one warm-up, then repeat until ``min_time``
+    seconds have passed (at least 3, at most ``max_repeats`` runs)."""
+    func()
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeats and (len(times) < 3 or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - t0) * 1e3)
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "runs": len(times)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="write the current numbers as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor (default 1.5)")
+    parser.add_argument("--max-n", type=int, default=max(SIZES), help="largest N to run (default 10^6)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds of repetitions per case")
+    parser.add_argument("--max-repeats", type=int, default=50)
+    parser.add_argument("filters", nargs="*", help="only run cases whose name contains one of these")
+    args = parser.parse_args()
+
+    baseline = common.load_baseline(BASELINE_FILE)
+    results, failed = {}, []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cases = casos(args.max_n, tmpdir)
+        print(f"{'case':<36}{'median ms':>11}{'min ms':>10}{'baseline':>10}{'runs':>6}")
+        for name, func in cases.items():
+            if args.filters and not any(f in name for f in args.filters):
+                continue
+            r = medir(func, args.min_time, args.max_repeats)
+            results[name] = {"median_ms": round(r["median_ms"], 3), "min_ms": round(r["min_ms"], 3)}
+            base = baseline.get(name, {}).get("median_ms")
+            status = ""
+            if not args.update and common.slower(r["median_ms"], base, args.tolerance):
+                failed.append(name)
+                status = "  REGRESSION"
+            print(f"{name:<36}{r['median_ms']:>11.2f}{r['min_ms']:>10.2f}"
+                  f"{(base if base is not None else float('nan')):>10.2f}{r['runs']:>6}{status}")
+
+    if args.update:
+        common.save_baseline(BASELINE_FILE, results)
+        print(f"Baseline written to {BASELINE_FILE}")
+    elif failed:
+        print(f"Regressions: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
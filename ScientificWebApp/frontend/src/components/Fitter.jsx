@@ -67,6 +67,8 @@ const Fitter = () => {
                 dy: points.map(p => parseFloat(p.dy) || 0),
                 model,
                 ...meta,
+                // Charts are drawn client-side; skip the server PNG
+                render: 'none',
             };
             const response = await axios.post('/api/fit', data);
             setResult(response.data);
@@ -31,7 +31,7 @@ const Gauss = () => {
                 setLoading(false);
                 return;
             }
-            const response = await axios.post('/api/gauss', { values: nums });
+            const response = await axios.post('/api/gauss', { values: nums, render: 'none' });
             setResult(response.data);
         } catch (err) {
             setError(err.response?.data?.detail || 'Error');
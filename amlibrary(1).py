@@ -1,3 +1,8 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import statistics as stats
 import pandas as pd
@@ -7,7 +12,11 @@ from iminuit import Minuit, cost
 import matplotlib.gridspec as gridspec
 import math
 import matplotlib
-matplotlib.rcParams["text.usetex"] = True
+
+# El texto de las graficas usa mathtext (el motor interno de matplotlib) por
+# defecto. Con usetex=True cada texto pasa por un proceso de LaTeX externo:
+# mas fiel a LaTeX, pero mucho mas lento.
+USETEX = False
 
 # Modelo lineal
 def funcion_lineal(x, a, b):
@@ -28,7 +37,11 @@ def funcionChi2(x, y, yerr, funcionx):
   return(float(chi2_val/ndof), m.values[0], m.values[1])
 
 
-def graf_plot(dtframe):
+def graf_plot(dtframe, usetex=USETEX):
+    with matplotlib.rc_context({"text.usetex": usetex}):
+        return _graf_plot(dtframe)
+
+def _graf_plot(dtframe):
     fig, ax = plt.subplots()
 
     x = dtframe['x']
@@ -52,8 +65,8 @@ def graf_plot(dtframe):
     format = r"${:.5f}$"
     stats = (
         r"$\chi^2 / \nu $ =" + str(f"{fitQty:.{5}g}") + "\n\n"
-        r"$\textup{p}_0$ = " + str(f"{dat_c.iloc[0]:.{5}e}") + "\n\n"
-        r"$\textup{p}_1$ = " + str(f"{dat_m.iloc[0]:.{5}e}")
+        r"$\mathrm{p}_0$ = " + str(f"{dat_c.iloc[0]:.{5}e}") + "\n\n"
+        r"$\mathrm{p}_1$ = " + str(f"{dat_m.iloc[0]:.{5}e}")
     )
 
     ax.legend(
@@ -89,64 +102,91 @@ def graf_plot(dtframe):
     bbox = dict(boxstyle="round", fc="#FFFFFF", ec="lightgray")
 
     plt.tight_layout()
+    return fig
     
 
 def Constante(a,x,dx):
     xy=a*x #mesurando operacion
     dxy=abs(a)*dx #error operacion
-    print("ax' = ",xy,"\u00B1",dxy)
+    return xy,dxy
 
 def Potencia(n,x,dx):
     xy=pow(x,n)
     dxy=abs(n*pow(x,n-1))*dx
-    print(" x'"+"\u207f = ",xy,"\u00B1",dxy)
+    return xy,dxy
 
 def Producto(x,dx,y,dy):
     xy=x*y
-    dxy=abs(xy)*np.sqrt((dx/x)*(dx/x)+(dy/y)*(dy/y))
-    print(" x'y' = ",xy,"\u00B1",dxy)
+    dxy=np.sqrt((y*dx)*(y*dx)+(x*dy)*(x*dy)) #igual a |xy|sqrt((dx/x)^2+(dy/y)^2), tambien con x o y = 0
+    return xy,dxy
 
 def Suma(x,dx,y,dy):
     xy=x+y #mesurando suma                   
     dxy=np.sqrt((dx)*(dx)+(dy)*(dy))
-    print(" x' + y' = ",xy,"\u00B1",dxy)
+    return xy,dxy
 
 def Resta(x,dx,y,dy):
     xy=x-y #mesurando suma                   
     dxy=np.sqrt((dx)*(dx)+(dy)*(dy))
-    print(" x' - y' = ",xy,"\u00B1",dxy)
+    return xy,dxy
 
 def Exponente(x,dx):
     xy=np.exp(x)
     dxy=np.exp(x)*dx
-    print(" e"+"\u02e3' = ",xy,"\u00B1",dxy)
+    return xy,dxy
 
 def Division(x,dx,y,dy):
     xy=x/y
-    dxy=abs(x/y)*np.sqrt(pow(dx/x,2)+pow(dy/y,2))
-    print(" x'/y' = ",xy,"\u00B1",dxy)
+    dxy=np.sqrt(pow(dx/y,2)+pow(x*dy/(y*y),2)) #igual a |x/y|sqrt((dx/x)^2+(dy/y)^2), tambien con x = 0
+    return xy,dxy
 
 def Cos(x,dx):
     xy=np.cos(x)
-    dxy=abs(np.cos(x))*dx
-    print(" Cos(x') = ",xy,"\u00B1",dxy)
+    dxy=abs(np.sin(x))*dx
+    return xy,dxy
 
 def Sin(x,dx):
     xy=np.sin(x)
-    dxy=abs(np.sin(x))*dx
-    print(" Sin(x') = ",xy,"\u00B1",dxy)
+    dxy=abs(np.cos(x))*dx
+    return xy,dxy
 
 def Log_nat(x,dx):
     xy=np.log(x)
-    dxy=dx/x
-    print(" ln(x') = ",xy,"\u00B1",dxy)
+    dxy=abs(dx/x)
+    return xy,dxy
 
 def fgaus(x):
     n=len(x)
     vsp=stats.mean(x)
     dst=stats.stdev(x)
     dx=dst/np.sqrt(n)
-    print(" x' = ",vsp,"\u00B1",dx)
+    return vsp,dx
+
+# Codigo de operacion -> (funcion, columnas que usa, texto del resultado)
+OPERACIONES = {
+    'S': (Suma, ('x', 'dx', 'y', 'dy'), " x' + y' = "),
+    'R': (Resta, ('x', 'dx', 'y', 'dy'), " x' - y' = "),
+    'M': (Producto, ('x', 'dx', 'y', 'dy'), " x'y' = "),
+    'D': (Division, ('x', 'dx', 'y', 'dy'), " x'/y' = "),
+    'C': (Constante, ('a', 'x', 'dx'), "ax' = "),
+    'P': (Potencia, ('n', 'x', 'dx'), " x'"+"\u207f = "),
+    'Exp': (Exponente, ('x', 'dx'), " e"+"\u02e3' = "),
+    'Cos': (Cos, ('x', 'dx'), " Cos(x') = "),
+    'Sin': (Sin, ('x', 'dx'), " Sin(x') = "),
+    'ln': (Log_nat, ('x', 'dx'), " ln(x') = "),
+}
+
+# Nombres aceptados en los archivos de lote, ademas de los codigos del menu
+# (los de la API: suma, resta, producto, ...)
+ALIAS = {
+    'suma': 'S', 'sume': 'S', 'resta': 'R', 'reste': 'R', 'producto': 'M', 'multiplique': 'M',
+    'division': 'D', 'divida': 'D', 'constante': 'C', 'potencia': 'P', 'exponente': 'Exp',
+    'exp': 'Exp', 'cos': 'Cos', 'coseno': 'Cos', 'sin': 'Sin', 'seno': 'Sin', 'ln': 'ln', 'log': 'ln',
+}
+
+def mostrar(funct, resultado):
+    texto = OPERACIONES[funct][2] if funct in OPERACIONES else " x' = "
+    print(texto, resultado[0], "\u00B1", resultado[1])
 
 def error_prop():
     opoaraciones= np.array([['G', 'S', 'R', 'M', 'D', 'C', 'P', 'Exp', 'Cos', 'Sin', 'ln'],
@@ -171,60 +211,60 @@ def error_prop():
             dx=float(input(" \u0394"+"x= "))
             y=float(input(" y= "))
             dy=float(input(" \u0394"+"y= "))
-            Suma(x,dx,y,dy)
+            mostrar("S", Suma(x,dx,y,dy))
     
         elif(funct=="R"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
             y=float(input(" y= "))
             dy=float(input(" \u0394"+"y= "))
-            Resta(x,dx,y,dy)
+            mostrar("R", Resta(x,dx,y,dy))
     
         elif(funct=="C"):
             a=float(input(" a= "))
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
-            Constante(a,x,dx)
+            mostrar("C", Constante(a,x,dx))
     
         elif(funct=="P"):
             n=float(input(" n= "))
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
-            Potencia(n,x,dx)
+            mostrar("P", Potencia(n,x,dx))
     
         elif(funct=="M"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
             y=float(input(" y= "))
             dy=float(input(" \u0394"+"y= "))
-            Producto(x,dx,y,dy)
+            mostrar("M", Producto(x,dx,y,dy))
     
         elif(funct=="Exp"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
-            Exponente(x,dx)
+            mostrar("Exp", Exponente(x,dx))
     
         elif(funct=="D"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
             y=float(input(" y= "))
             dy=float(input(" \u0394"+"y= "))
-            Division(x,dx,y,dy)
+            mostrar("D", Division(x,dx,y,dy))
     
         elif(funct=="Cos"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
-            Cos(x,dx)
+            mostrar("Cos", Cos(x,dx))
     
         elif(funct=="Sin"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
-            Sin(x,dx)
+            mostrar("Sin", Sin(x,dx))
     
         elif(funct=="ln"):
             x=float(input(" x= "))
             dx=float(input(" \u0394"+"x= "))
-            Log_nat(x,dx)
+            mostrar("ln", Log_nat(x,dx))
     
         elif(funct=="G"):
             x=[]
@@ -235,11 +275,208 @@ def error_prop():
                 x.append(valor)
             print(x)
             print("\n")    
-            fgaus(x)
+            mostrar("G", fgaus(x))
         print("\n")
         rsp=input("Desea otra operacion s/n ? ")
     
         if((rsp=="S") or (rsp=="s") ):
             rsp=True
         else:
-            rsp=False
\ No newline at end of file
+            rsp=False
+
+# ========== MODO LOTE ==========
+#
+#   python "amlibrary(1).py"                                  # menu interactivo
+#   python "amlibrary(1).py" operaciones datos.csv -o res.csv
+#   python "amlibrary(1).py" ajuste d1.csv d2.csv --salida graficos/ [--usetex]
+#
+# Archivo de operaciones (CSV o JSON, lista de filas): columna "operacion"
+# (codigo del menu o nombre) y las columnas que usen sus operaciones, de x,
+# dx, y, dy, n, a (si falta alguna, el archivo se rechaza). Cada operacion se
+# evalua de una vez sobre todas sus filas (numpy); con muchas filas los
+# bloques se reparten entre procesos. Las filas fuera de dominio o con
+# resultado no finito quedan sin valor ni error y con el motivo en la columna
+# "mensaje", como en la API.
+#
+# Ajuste: cada CSV con columnas x, y, dx, dy, o un JSON con una lista de
+# conjuntos {"nombre", "x", "y", "dx", "dy", "titulo", "eje x", "eje y"}; dx
+# es opcional (ceros). Los conjuntos se ajustan y grafican en paralelo, uno
+# por proceso.
+
+FILAS_POR_PROCESO = 200_000
+
+# Filas fuera del dominio de una operacion: codigo -> (condicion, mensaje)
+DOMINIO = {
+    'D': (lambda x, dx, y, dy: y == 0, "División por cero"),
+    'ln': (lambda x, dx: x <= 0, "Log de número no positivo"),
+}
+NO_FINITO = "Resultado no finito (fuera de dominio o desbordamiento)"
+
+def codigo_operacion(nombre):
+    nombre = str(nombre).strip()
+    if nombre in OPERACIONES:
+        return nombre
+    codigo = ALIAS.get(nombre.lower())
+    if codigo is None:
+        raise ValueError(f"Operacion desconocida: {nombre}")
+    return codigo
+
+def leer_tabla(ruta):
+    if ruta.lower().endswith('.json'):
+        with open(ruta) as f:
+            return pd.DataFrame(json.load(f))
+    # Separador (coma, punto y coma o tabulador) segun la cabecera, para
+    # leer con el lector en C de pandas
+    with open(ruta) as f:
+        cabecera = f.readline()
+    sep = max((',', ';', '\t'), key=cabecera.count)
+    return pd.read_csv(ruta, sep=sep)
+
+def evaluar_operaciones(tabla):
+    """Anade las columnas valor, error y mensaje a una tabla de operaciones,
+    evaluando cada operacion vectorizada sobre todas sus filas. Las filas
+    fuera de dominio o con resultado no finito quedan con valor y error
+    vacios y el motivo en mensaje."""
+    tabla = tabla.copy()
+    tabla.columns = [str(c).strip().lower() for c in tabla.columns]
+    if 'operacion' not in tabla:
+        raise ValueError("Falta la columna operacion")
+    nombres = tabla['operacion'].astype(str)
+    codigos = nombres.map({n: codigo_operacion(n) for n in nombres.unique()})
+    for codigo in codigos.unique():
+        faltan = [c for c in OPERACIONES[codigo][1] if c not in tabla]
+        if faltan:
+            raise ValueError(f"Faltan las columnas {', '.join(faltan)} para la operacion {codigo}")
+    valor = np.full(len(tabla), np.nan)
+    error = np.full(len(tabla), np.nan)
+    mensaje = np.full(len(tabla), None, dtype=object)
+    with np.errstate(all='ignore'):
+        for codigo, filas in tabla.groupby(codigos).groups.items():
+            funcion, columnas, _ = OPERACIONES[codigo]
+            idx = tabla.index.get_indexer(filas)
+            args = [tabla[c].to_numpy(dtype=float)[idx] for c in columnas]
+            valor[idx], error[idx] = funcion(*args)
+            if codigo in DOMINIO:
+                condicion, texto = DOMINIO[codigo]
+                mensaje[idx[condicion(*args)]] = texto
+    malas = ~(np.isfinite(valor) & np.isfinite(error))
+    mensaje[malas & pd.isna(mensaje)] = NO_FINITO
+    malas |= pd.notna(mensaje)
+    valor[malas] = np.nan
+    error[malas] = np.nan
+    tabla['valor'] = valor
+    tabla['error'] = error
+    tabla['mensaje'] = mensaje
+    return tabla
+
+def operaciones_lote(tabla, procesos=None):
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(tabla) < 2 * FILAS_POR_PROCESO:
+        return evaluar_operaciones(tabla)
+    bloques = [tabla.iloc[i:i + FILAS_POR_PROCESO] for i in range(0, len(tabla), FILAS_POR_PROCESO)]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return pd.concat(pool.map(evaluar_operaciones, bloques))
+
+def completar_conjunto(conjunto, ruta):
+    """Comprueba que el conjunto tenga x, y, dy; sin dx se usan ceros."""
+    for c in ('x', 'y', 'dy'):
+        if c not in conjunto:
+            raise ValueError(f"{ruta}: falta la columna {c}")
+    conjunto.setdefault('dx', [0.0] * len(conjunto['x']))
+    return conjunto
+
+def leer_conjuntos(rutas):
+    conjuntos = []
+    for ruta in rutas:
+        if ruta.lower().endswith('.json'):
+            with open(ruta) as f:
+                datos = json.load(f)
+            for i, conjunto in enumerate(datos if isinstance(datos, list) else [datos]):
+                conjunto.setdefault('nombre', f"{os.path.splitext(os.path.basename(ruta))[0]}_{i}")
+                conjuntos.append(completar_conjunto(conjunto, ruta))
+        else:
+            tabla = leer_tabla(ruta)
+            tabla.columns = [str(c).strip().lower() for c in tabla.columns]
+            conjunto = {c: tabla[c].tolist() for c in ('x', 'y', 'dx', 'dy') if c in tabla}
+            conjunto['nombre'] = os.path.splitext(os.path.basename(ruta))[0]
+            conjuntos.append(completar_conjunto(conjunto, ruta))
+    return conjuntos
+
+def ajustar_conjunto(conjunto, salida, formato='png', usetex=USETEX):
+    """Ajuste lineal y grafica de un conjunto; devuelve la fila del resumen."""
+    x, y, dx, dy = (np.asarray(conjunto[c], dtype=float) for c in ('x', 'y', 'dx', 'dy'))
+    chi2_ndof, a, b = funcionChi2(x, y, dy, funcion_lineal)
+    dtframe = pd.DataFrame({
+        'x': x, 'y': y, 'dx': dx, 'dy': dy, 'a': a, 'b': b, 'chi2': chi2_ndof,
+        'titulo': conjunto.get('titulo', conjunto['nombre']),
+        'eje x': conjunto.get('eje x', 'x'),
+        'eje y': conjunto.get('eje y', 'y'),
+    })
+    fig = graf_plot(dtframe, usetex=usetex)
+    imagen = os.path.join(salida, f"{conjunto['nombre']}.{formato}")
+    fig.savefig(imagen, format=formato)
+    plt.close(fig)
+    return {'nombre': conjunto['nombre'], 'n': len(x), 'a': a, 'b': b, 'chi2_ndof': chi2_ndof, 'imagen': imagen}
+
+def ajuste_lote(conjuntos, salida, formato='png', usetex=USETEX, procesos=None):
+    os.makedirs(salida, exist_ok=True)
+    procesos = min(procesos or os.cpu_count() or 1, len(conjuntos))
+    if procesos <= 1:
+        return [ajustar_conjunto(c, salida, formato, usetex) for c in conjuntos]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = [pool.submit(ajustar_conjunto, c, salida, formato, usetex) for c in conjuntos]
+        return [f.result() for f in futuros]
+
+def escribir_tabla(tabla, ruta):
+    if ruta is None:
+        tabla.to_csv(sys.stdout, index=False)
+    elif ruta.lower().endswith('.json'):
+        tabla.to_json(ruta, orient='records', indent=2, double_precision=15)
+    else:
+        try:
+            # Mucho mas rapido que to_csv con tablas grandes, si esta instalado
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+        except ImportError:
+            tabla.to_csv(ruta, index=False)
+        else:
+            pa_csv.write_csv(pa.Table.from_pandas(tabla, preserve_index=False), ruta,
+                             pa_csv.WriteOptions(quoting_style="needed"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propagacion de errores y ajustes lineales en lote.")
+    sub = parser.add_subparsers(dest='modo')
+    ops = sub.add_parser('operaciones', help="evaluar un archivo de operaciones")
+    ops.add_argument('archivo')
+    ops.add_argument('-o', '--salida', help="CSV o JSON de resultados (por defecto, la salida estandar)")
+    ops.add_argument('--procesos', type=int, help="procesos a usar (por defecto, todos los nucleos)")
+    aj = sub.add_parser('ajuste', help="ajustar y graficar conjuntos de datos")
+    aj.add_argument('archivos', nargs='+')
+    aj.add_argument('--salida', default='graficos', help="carpeta de graficas y resumen.csv")
+    aj.add_argument('--formato', default='png', choices=('png', 'svg', 'pdf'))
+    aj.add_argument('--usetex', action='store_true', help="texto con LaTeX externo (lento)")
+    aj.add_argument('--procesos', type=int, help="procesos a usar (por defecto, todos los nucleos)")
+    args = parser.parse_args(argv)
+
+    if args.modo is None:
+        error_prop()
+        return
+    try:
+        if args.modo == 'operaciones':
+            tabla = operaciones_lote(leer_tabla(args.archivo), args.procesos)
+            escribir_tabla(tabla, args.salida)
+            malas = int(tabla['mensaje'].notna().sum())
+            if malas:
+                print(f"{malas} filas sin resultado (ver columna mensaje)", file=sys.stderr)
+        else:
+            plt.switch_backend('Agg')
+            filas = ajuste_lote(leer_conjuntos(args.archivos), args.salida, args.formato, args.usetex, args.procesos)
+            escribir_tabla(pd.DataFrame(filas), os.path.join(args.salida, 'resumen.csv'))
+            print(f"{len(filas)} ajustes en {args.salida}")
+    except ValueError as e:
+        # Operacion desconocida, columnas que faltan...
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()